@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+# Load tests of the shop against the in-process ERP stub (projekt/erp_stub.py).
@@ -0,0 +1,186 @@
+# benchmarks/bench_db.py
+
+"""
+Concurrent read/write benchmark of the SQLite profiles (projekt/db_profile.py).
+
+For every profile a fresh SQLite file with the shop's tables is hammered
+for a fixed time by concurrent threads:
+
+- readers:  catalog page queries (ORDER BY name LIMIT/OFFSET), like index()
+- writers:  cart line upserts + cart touch in one transaction, like cart_add
+- sync:     one thread updating products in chunks of 500 rows per
+            transaction, like perform_erp_sync()
+
+and reports operations/s, p50/p95/p99 latency and failed operations
+(e.g. "database is locked") per role.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_db
+    python -m benchmarks.bench_db --readers 8 --writers 4 --seconds 10 --profiles default,tuned
+
+Uses its own temporary SQLite databases, never instance/shop.db.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from sqlalchemy import bindparam, create_engine, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import OperationalError
+
+from .bench_routes import percentile, remove_database
+
+
+SYNC_CHUNK_SIZE = 500
+
+
+def setup_database(profile, catalog_size, pool_size):
+    """Creates a temporary SQLite DB with the shop schema and products, returns (engine, path, product_ids)."""
+    fd, db_path = tempfile.mkstemp(prefix=f'bench_db_{profile}_', suffix='.db')
+    os.close(fd)
+    url = f"sqlite:///{db_path}"
+
+    from projekt import db
+    from projekt.db_profile import SQLITE_PROFILES, engine_options, apply_sqlite_pragmas
+    from projekt.models import Product
+
+    engine = create_engine(url, **engine_options(url, pool_size=pool_size, max_overflow=0, pool_timeout=30))
+    apply_sqlite_pragmas(engine, SQLITE_PROFILES[profile])
+    db.metadata.create_all(engine)
+
+    product_ids = [str(uuid.uuid4()) for _ in range(catalog_size)]
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [
+            {'id': pid, 'name': f"Product {i:05d}", 'description': f"Description {i}" * 5, 'price': 10 + i % 100}
+            for i, pid in enumerate(product_ids)
+        ])
+    return engine, db_path, product_ids
+
+
+def run_profile(profile, readers, writers, seconds, catalog_size):
+    from projekt.models import Product, Cart, CartItem
+
+    engine, db_path, product_ids = setup_database(profile, catalog_size, pool_size=readers + writers + 1)
+    cart_ids = [uuid.uuid4().hex for _ in range(writers)]
+    with engine.begin() as conn:
+        conn.execute(insert(Cart), [{'id': cart_id} for cart_id in cart_ids])
+
+    results = {role: {'latencies': [], 'failures': 0} for role in ('read', 'write', 'sync')}
+    lock = threading.Lock()
+    stop = threading.Event()
+    barrier = threading.Barrier(readers + writers + 1 + 1)
+
+    def record(role, func):
+        started = time.perf_counter()
+        try:
+            func()
+        except OperationalError:
+            with lock:
+                results[role]['failures'] += 1
+            return
+        with lock:
+            results[role]['latencies'].append(time.perf_counter() - started)
+
+    def reader(number):
+        rng = random.Random(number)
+        pages = max(catalog_size // 20, 1)
+        def read():
+            with engine.connect() as conn:
+                conn.execute(select(Product).order_by(Product.name, Product.id)
+                             .limit(20).offset(rng.randrange(pages) * 20)).all()
+        barrier.wait()
+        while not stop.is_set():
+            record('read', read)
+
+    def writer(number):
+        rng = random.Random(1000 + number)
+        cart_id = cart_ids[number]
+        def write():
+            stmt = sqlite_insert(CartItem).values(cart_id=cart_id, product_id=rng.choice(product_ids), quantity=1)
+            stmt = stmt.on_conflict_do_update(index_elements=[CartItem.cart_id, CartItem.product_id],
+                                              set_={'quantity': CartItem.quantity + 1})
+            with engine.begin() as conn:
+                conn.execute(stmt)
+                conn.execute(update(Cart).where(Cart.id == cart_id).values(updated_at=Cart.updated_at))
+        barrier.wait()
+        while not stop.is_set():
+            record('write', write)
+
+    def sync():
+        rng = random.Random(42)
+        def write_chunk():
+            chunk = rng.sample(product_ids, min(SYNC_CHUNK_SIZE, len(product_ids)))
+            with engine.begin() as conn:
+                conn.execute(update(Product).where(Product.id == bindparam('pid')).values(price=bindparam('new_price')),
+                             [{'pid': pid, 'new_price': rng.randint(5, 500)} for pid in chunk])
+        barrier.wait()
+        while not stop.is_set():
+            record('sync', write_chunk)
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads.append(threading.Thread(target=sync))
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    engine.dispose()
+    remove_database(db_path)
+
+    rows = []
+    for role, result in results.items():
+        latencies = result['latencies']
+        rows.append({
+            'profile': profile,
+            'role': role,
+            'ops': len(latencies),
+            'throughput': len(latencies) / wall,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p95_ms': percentile(latencies, 95) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'failures': result['failures'],
+        })
+    return rows
+
+
+HEADER = (f"{'profile':<8} {'role':<6} {'ops':>7} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'fail':>5}")
+
+def format_row(r):
+    return (f"{r['profile']:<8} {r['role']:<6} {r['ops']:>7} {r['throughput']:>9.1f} "
+            f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['failures']:>5}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--profiles', default='default,tuned', help='Comma-separated SQLite profiles')
+    parser.add_argument('--readers', type=int, default=8, help='Concurrent reading threads')
+    parser.add_argument('--writers', type=int, default=4, help='Concurrent cart-writing threads')
+    parser.add_argument('--seconds', type=float, default=5.0, help='Duration per profile')
+    parser.add_argument('--catalog-size', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    print(HEADER)
+    results = []
+    for profile in [p.strip() for p in args.profiles.split(',') if p.strip()]:
+        for row in run_profile(profile, args.readers, args.writers, args.seconds, args.catalog_size):
+            results.append(row)
+            print(format_row(row))
+        sys.stdout.flush()
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+# benchmarks/bench_login.py
+
+"""
+Login throughput benchmark of the password hashing (projekt/passwords.py).
+
+For every combination of hashing method (cost) and number of hashing
+processes, N concurrent clients POST /login for a fixed number of logins
+while one probe client keeps requesting the (cheap) login page. Reports
+logins/s, logins/s per core used for hashing, login latency and the
+latency of the probe requests, i.e. how much a login storm stalls the
+other requests of the same worker (inline hashing holds the GIL).
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_login
+    python -m benchmarks.bench_login --methods scrypt:16384:8:1,pbkdf2:sha256:600000 --workers 0,2,4 --concurrency 8
+
+workers=0 hashes inline in the request threads (the old behaviour).
+Uses its own temporary SQLite database, never instance/shop.db.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+from .bench_routes import percentile, setup_shop, teardown_shop
+
+
+BENCH_PASSWORD = 'bench-password'
+
+
+def create_users(app, count, method):
+    """Creates 'count' users whose password hash uses 'method', returns their emails."""
+    from projekt import db
+    from projekt.models import User
+    from projekt.passwords import password_hasher
+
+    stamp = time.time_ns()
+    emails = [f"login{i}-{stamp}@example.com" for i in range(count)]
+    with app.app_context():
+        pw_hash = password_hasher.hash(BENCH_PASSWORD) # One hash for all users: same verification cost
+        db.session.add_all([User(name=f"Login User {i}", email=email, password_hash=pw_hash)
+                            for i, email in enumerate(emails)])
+        db.session.commit()
+    return emails
+
+
+def run_config(app, method, workers, concurrency, logins):
+    from projekt.passwords import password_hasher
+
+    with app.app_context(): # The hasher of this app (see projekt/services.py)
+        password_hasher.shutdown()
+        password_hasher.method = method
+        password_hasher.workers = workers
+    emails = create_users(app, concurrency, method) # Also starts the pool (warm-up)
+
+    per_client = max(logins // concurrency, 1)
+    latencies = []
+    probe_latencies = []
+    failures = [0]
+    lock = threading.Lock()
+    done = threading.Event()
+    barrier = threading.Barrier(concurrency + 2)
+
+    def login_client(number):
+        client = app.test_client()
+        barrier.wait()
+        for _ in range(per_client):
+            started = time.perf_counter()
+            response = client.post('/login', data={'email': emails[number], 'password': BENCH_PASSWORD})
+            elapsed = time.perf_counter() - started
+            with lock:
+                if response.headers.get('Location', '').endswith('/'):
+                    latencies.append(elapsed)
+                else:
+                    failures[0] += 1
+
+    def probe():
+        client = app.test_client()
+        barrier.wait()
+        while not done.is_set():
+            started = time.perf_counter()
+            client.get('/login')
+            probe_latencies.append(time.perf_counter() - started)
+            time.sleep(0.005)
+
+    threads = [threading.Thread(target=login_client, args=(i,)) for i in range(concurrency)]
+    probe_thread = threading.Thread(target=probe)
+    for thread in threads + [probe_thread]:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    done.set()
+    probe_thread.join()
+
+    cores = min(max(workers, 1), os.cpu_count() or 1)
+    return {
+        'method': method,
+        'workers': workers,
+        'concurrency': concurrency,
+        'logins': len(latencies),
+        'throughput': len(latencies) / wall,
+        'per_core': len(latencies) / wall / cores,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'probe_p50_ms': percentile(probe_latencies, 50) * 1000,
+        'probe_p95_ms': percentile(probe_latencies, 95) * 1000,
+        'failures': failures[0],
+    }
+
+
+HEADER = (f"{'method':<24} {'workers':>7} {'conc':>5} {'logins':>7} {'login/s':>8} {'/core':>7} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'probe p50':>9} {'probe p95':>9} {'fail':>5}")
+
+def format_row(r):
+    return (f"{r['method']:<24} {r['workers']:>7} {r['concurrency']:>5} {r['logins']:>7} {r['throughput']:>8.1f} "
+            f"{r['per_core']:>7.1f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+            f"{r['probe_p50_ms']:>9.1f} {r['probe_p95_ms']:>9.1f} {r['failures']:>5}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--methods', default='scrypt:32768:8:1,scrypt:16384:8:1,pbkdf2:sha256:600000',
+                        help='Comma-separated Werkzeug hashing methods')
+    parser.add_argument('--workers', default='0,2', help='Comma-separated numbers of hashing processes (0 = inline)')
+    parser.add_argument('--concurrency', type=int, default=4, help='Concurrent login clients')
+    parser.add_argument('--logins', type=int, default=40, help='Measured logins per run')
+    args = parser.parse_args(argv)
+
+    app, stub, product_ids, db_path = setup_shop(10, 0.0, 0.0)
+    print(f"CPU cores: {os.cpu_count()}")
+    print(HEADER)
+    results = []
+    try:
+        for method in [m.strip() for m in args.methods.split(',') if m.strip()]:
+            for workers in [int(w) for w in args.workers.split(',')]:
+                result = run_config(app, method, workers, args.concurrency, args.logins)
+                results.append(result)
+                print(format_row(result))
+                sys.stdout.flush()
+    finally:
+        from projekt.passwords import password_hasher
+        with app.app_context():
+            password_hasher.shutdown()
+        teardown_shop(app, db_path)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+# benchmarks/bench_routes.py
+
+"""
+Load-test benchmark of the shop routes against the in-process ERP stub.
+
+Drives /, /product/<id>, /cart, /cart/add and /checkout through Flask's
+test client with N concurrent clients and different cart sizes and reports
+p50/p95/p99 latency, throughput, ERP calls per request and (from the
+'Server-Timing' header) SQL statements and render time per request.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_routes
+    python -m benchmarks.bench_routes --concurrency 1,8 --cart-sizes 1,20 --latency 0.01
+
+Uses its own temporary SQLite database, never instance/shop.db.
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+
+
+def percentile(values, p):
+    """p-th percentile (0..100) with linear interpolation."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+def setup_shop(catalog_size, latency, error_rate):
+    """
+    Creates an app on a fresh temporary database, mounts the ERP stub on
+    its ERP client and runs a full product sync.
+    """
+    fd, db_path = tempfile.mkstemp(prefix='bench_shop_', suffix='.db')
+    os.close(fd)
+
+    from projekt import create_app, db, erp, sync
+    from projekt.erp_stub import ErpStubAdapter
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{db_path}"})
+    stub = ErpStubAdapter(catalog_size=catalog_size, latency=latency, error_rate=error_rate)
+
+    with app.app_context():
+        stub.mount(erp.erp_client.session, erp.ERP_BASE_URL)
+        db.create_all()
+        print(sync.perform_erp_sync(mode='full'))
+    return app, stub, list(stub.products), db_path
+
+def remove_database(db_path):
+    """Deletes a temporary SQLite database incl. its WAL/shared-memory files."""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+def teardown_shop(app, db_path):
+    """Closes the app's database connections and deletes the database of setup_shop()."""
+    from projekt import db
+
+    with app.app_context():
+        db.engine.dispose()
+    remove_database(db_path)
+
+
+def server_timing(response):
+    """Parses the 'Server-Timing' header (projekt/metrics.py): {name: (ms, desc)}."""
+    timings = {}
+    for m in re.finditer(r'(\w+);dur=([\d.]+)(?:;desc="([^"]*)")?', response.headers.get('Server-Timing', '')):
+        timings[m.group(1)] = (float(m.group(2)), m.group(3) or '')
+    return timings
+
+
+class BenchClient:
+    """One simulated user: own test client (cookies), registered and logged in."""
+
+    def __init__(self, app, product_ids, number):
+        self.app = app
+        self.client = app.test_client()
+        self.product_ids = product_ids
+        self.rng = random.Random(number)
+        email = f"bench{number}-{time.time_ns()}@example.com"
+        self.client.post('/register', data={
+            'name': f"Bench User {number}", 'email': email, 'password': 'bench-password',
+            'street': 'Benchstr.', 'house_number': '1', 'zip_code': '12345', 'city': 'Benchtown',
+        })
+        with self.client.session_transaction() as sess:
+            self.user_id = int(sess['_user_id'])
+
+    def fill_cart(self, cart_size):
+        """Puts cart_size products into the (server-side) cart WITHOUT calling the ERP."""
+        from projekt import routes
+
+        with self.app.app_context():
+            cart_id = routes.cart_store.cart_id_for_user(self.user_id, create=True)
+            routes.cart_store.clear(cart_id)
+            for pid in self.rng.sample(self.product_ids, cart_size):
+                routes.cart_store.set_quantity(cart_id, pid, 1)
+        with self.client.session_transaction() as sess:
+            sess['cart_id'] = cart_id
+
+    # --- Scenarios: (prepare, measured request) ---
+
+    def index(self, cart_size):
+        page = self.rng.randint(1, 5)
+        return None, lambda: self.client.get(f"/?page={page}")
+
+    def product(self, cart_size):
+        pid = self.rng.choice(self.product_ids)
+        return None, lambda: self.client.get(f"/product/{pid}")
+
+    def cart(self, cart_size):
+        return (lambda: self.fill_cart(cart_size)), lambda: self.client.get('/cart')
+
+    def cart_add(self, cart_size):
+        pid = self.rng.choice(self.product_ids)
+        return None, lambda: self.client.post(f"/cart/add/{pid}", data={'quantity': '1'})
+
+    def checkout(self, cart_size):
+        return (lambda: self.fill_cart(cart_size)), lambda: self.client.post('/checkout')
+
+
+def is_success(scenario, response):
+    if response.status_code >= 400:
+        return False
+    if scenario == 'checkout':
+        # Success redirects to "My Orders", every failure back to the cart
+        return response.headers.get('Location', '').endswith('/orders')
+    return True
+
+
+def run_scenario(app, stub, product_ids, scenario, concurrency, cart_size, total_requests):
+    per_client = max(total_requests // concurrency, 1)
+    latencies = []
+    failures = [0]
+    sql_queries = []
+    render_ms = []
+    lock = threading.Lock()
+    started = {}
+    barrier = threading.Barrier(concurrency + 1, action=stub.reset_counters)
+
+    def worker(number):
+        bench = BenchClient(app, product_ids, number)
+        # Warm-up (e.g. creates the ERP customer on the first checkout)
+        prepare, send = getattr(bench, scenario)(cart_size)
+        if prepare:
+            prepare()
+        send()
+        barrier.wait()
+
+        own_latencies = []
+        own_failures = 0
+        own_sql = []
+        own_render = []
+        for _ in range(per_client):
+            prepare, send = getattr(bench, scenario)(cart_size)
+            if prepare:
+                prepare()
+            t0 = time.perf_counter()
+            response = send()
+            own_latencies.append(time.perf_counter() - t0)
+            if not is_success(scenario, response):
+                own_failures += 1
+            timing = server_timing(response)
+            if 'db' in timing:
+                own_sql.append(int(timing['db'][1].split()[0]))
+            if 'render' in timing:
+                own_render.append(timing['render'][0])
+        with lock:
+            latencies.extend(own_latencies)
+            failures[0] += own_failures
+            sql_queries.extend(own_sql)
+            render_ms.extend(own_render)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started['t'] = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started['t']
+
+    n = len(latencies)
+    return {
+        'scenario': scenario,
+        'concurrency': concurrency,
+        'cart_size': cart_size,
+        'requests': n,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'throughput': n / wall if wall else 0.0,
+        'erp_calls_per_request': stub.total_calls / n if n else 0.0,
+        'sql_per_request': sum(sql_queries) / len(sql_queries) if sql_queries else 0.0,
+        'render_ms': sum(render_ms) / len(render_ms) if render_ms else 0.0,
+        'failures': failures[0],
+    }
+
+
+HEADER = (f"{'scenario':<10} {'conc':>4} {'cart':>4} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'req/s':>8} {'erp/req':>8} {'sql/req':>8} {'rend ms':>8} {'fail':>5}")
+
+def format_row(r):
+    return (f"{r['scenario']:<10} {r['concurrency']:>4} {r['cart_size']:>4} {r['requests']:>5} "
+            f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {r['throughput']:>8.1f} "
+            f"{r['erp_calls_per_request']:>8.2f} {r['sql_per_request']:>8.1f} {r['render_ms']:>8.2f} {r['failures']:>5}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default='index,product,cart,cart_add,checkout')
+    parser.add_argument('--concurrency', default='1,4,16', help='Comma-separated numbers of concurrent clients')
+    parser.add_argument('--cart-sizes', default='1,10,50', help='Comma-separated cart sizes (cart, checkout)')
+    parser.add_argument('--requests', type=int, default=200, help='Measured requests per run')
+    parser.add_argument('--catalog-size', type=int, default=500)
+    parser.add_argument('--latency', type=float, default=0.005, help='Simulated ERP latency per call (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Share of ERP calls failing with 503')
+    args = parser.parse_args(argv)
+
+    app, stub, product_ids, db_path = setup_shop(args.catalog_size, args.latency, args.error_rate)
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    concurrencies = [int(c) for c in args.concurrency.split(',')]
+    cart_sizes = [int(c) for c in args.cart_sizes.split(',')]
+
+    print(HEADER)
+    results = []
+    try:
+        for scenario in scenarios:
+            sizes = cart_sizes if scenario in ('cart', 'checkout') else [0]
+            for concurrency in concurrencies:
+                for cart_size in sizes:
+                    result = run_scenario(app, stub, product_ids, scenario, concurrency,
+                                          min(cart_size, len(product_ids)), args.requests)
+                    results.append(result)
+                    print(format_row(result))
+                    sys.stdout.flush()
+    finally:
+        teardown_shop(app, db_path)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+# benchmarks/bench_startup.py
+
+"""
+Startup-time benchmark of the app factory (projekt.create_app()).
+
+Every round starts a fresh Python process (like a new gunicorn worker or
+test run without preloading) and measures:
+
+- import:   'import projekt' (Flask, SQLAlchemy, models, ...)
+- create:   create_app() on a temporary SQLite database
+- first:    the first request (GET /login) incl. template compilation
+- total:    all of the above
+
+plus, in one process, 'again': every further create_app() (e.g. one app
+per test), which must not pay the import cost again.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --rounds 10 --budget-ms 1500
+
+With --budget-ms the exit code is 1 if the median 'total' exceeds the
+budget (for CI).
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from .bench_routes import percentile, remove_database
+
+
+# Runs in the child process, prints the phase durations (seconds) as JSON
+CHILD = r'''
+import json, sys, time
+started = time.perf_counter()
+import projekt
+imported = time.perf_counter()
+app = projekt.create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1], 'JINJA_BYTECODE_CACHE': False})
+with app.app_context():
+    projekt.db.create_all()
+created = time.perf_counter()
+status = app.test_client().get('/login').status_code
+first = time.perf_counter()
+again = []
+for _ in range(int(sys.argv[2])):
+    t = time.perf_counter()
+    projekt.create_app({'SQLALCHEMY_DATABASE_URI': sys.argv[1], 'JINJA_BYTECODE_CACHE': False})
+    again.append(time.perf_counter() - t)
+print(json.dumps({'import': imported - started, 'create': created - imported, 'first': first - created,
+                  'total': first - started, 'again': again, 'status': status,
+                  'apscheduler': 'apscheduler' in sys.modules}))
+'''
+
+PHASES = ('import', 'create', 'first', 'total', 'again')
+
+
+# The child imports projekt from the repository root, wherever the caller runs
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_child(db_path, again):
+    """Starts one fresh process, returns its measurements (see CHILD)."""
+    output = subprocess.run([sys.executable, '-c', CHILD, f"sqlite:///{db_path}", str(again)],
+                            check=True, capture_output=True, text=True, cwd=REPO_ROOT).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+HEADER = f"{'phase':<8} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}"
+
+def format_row(phase, durations):
+    return (f"{phase:<8} {len(durations):>5} {percentile(durations, 50) * 1000:>9.1f} "
+            f"{percentile(durations, 95) * 1000:>9.1f} {max(durations) * 1000:>9.1f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=5, help='Fresh processes to start')
+    parser.add_argument('--again', type=int, default=5, help='Further create_app() calls per process')
+    parser.add_argument('--budget-ms', type=float, default=None,
+                        help="Fail (exit code 1) if the median 'total' exceeds this")
+    args = parser.parse_args(argv)
+
+    fd, db_path = tempfile.mkstemp(prefix='bench_startup_', suffix='.db')
+    os.close(fd)
+    results = {phase: [] for phase in PHASES}
+    try:
+        for _ in range(args.rounds):
+            result = run_child(db_path, args.again)
+            if result['status'] != 200:
+                print(f"GET /login answered {result['status']}")
+                return 1
+            if result['apscheduler']:
+                print("Note: apscheduler was imported without starting a scheduler")
+            for phase in PHASES:
+                values = result[phase]
+                results[phase].extend(values if isinstance(values, list) else [values])
+    finally:
+        remove_database(db_path)
+
+    print(HEADER)
+    for phase in PHASES:
+        if results[phase]:
+            print(format_row(phase, results[phase]))
+
+    if args.budget_ms is not None:
+        median_ms = percentile(results['total'], 50) * 1000
+        if median_ms > args.budget_ms:
+            print(f"Startup budget exceeded: {median_ms:.1f} ms > {args.budget_ms:.1f} ms")
+            return 1
+        print(f"Startup budget met: {median_ms:.1f} ms <= {args.budget_ms:.1f} ms")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+# benchmarks/bench_templates.py
+
+"""
+Render-time benchmark of the template caches (projekt/template_cache.py).
+
+- compile:  loading all templates in a fresh Jinja environment (like a new
+            or restarted worker), without and with a warm bytecode cache
+- table:    rendering the product table (_product_table.html) when the
+            catalog page cache misses (other page size/sort order/search),
+            without and with the {% cache %} fragments of the rows
+- layout:   rendering a small page extending base.html (nav + flashes),
+            without and with the cached nav
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_templates
+    python -m benchmarks.bench_templates --rounds 50 --per-page 100
+
+Uses its own temporary SQLite database and bytecode cache directory.
+"""
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+from .bench_routes import percentile, setup_shop, teardown_shop
+
+
+def timed(func, rounds):
+    durations = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - started)
+    return durations
+
+
+def bench_compile(app, rounds):
+    cache_dir = tempfile.mkdtemp(prefix='bench_jinja_')
+    names = [name for name in app.jinja_env.list_templates() if name.endswith('.html')]
+
+    def load_all(bytecode_cache):
+        env = app.create_jinja_environment() # Fresh environment = empty in-memory template cache
+        env.bytecode_cache = bytecode_cache
+        for name in names:
+            env.get_template(name)
+
+    try:
+        bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        load_all(bytecode_cache) # Fills the cache on disk, like the first worker
+        return [
+            ('compile', 'source', timed(lambda: load_all(None), rounds)),
+            ('compile', 'bytecode cache', timed(lambda: load_all(bytecode_cache), rounds)),
+        ]
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def bench_table(app, rounds, per_page):
+    from projekt import routes
+    from projekt.models import Product
+
+    def render_pages(sort):
+        pagination = Product.query.order_by(*routes.CATALOG_SORTS[sort]).paginate(
+            page=1, per_page=per_page, error_out=False)
+        return lambda: app.jinja_env.get_template('_product_table.html').render(
+            pagination=pagination, per_page=per_page, sort=sort, q='', catalog_version=0)
+
+    fragment_cache = app.jinja_env.fragment_cache
+    with app.test_request_context('/'):
+        render = render_pages('price') # The rows of this page are also on 'price_desc'/'name' pages
+        try:
+            app.jinja_env.fragment_cache = None
+            without = timed(render, rounds)
+        finally:
+            app.jinja_env.fragment_cache = fragment_cache
+        render() # Rows rendered once, e.g. by another sort order of the same products
+        return [
+            ('table', f'{per_page} rows, no fragments', without),
+            ('table', f'{per_page} rows, cached rows', timed(render, rounds)),
+        ]
+
+
+def bench_layout(app, rounds):
+    page = app.jinja_env.from_string('{% extends "base.html" %}{% block content %}<p>Hello</p>{% endblock %}')
+    fragment_cache = app.jinja_env.fragment_cache
+    with app.test_request_context('/'):
+        app.preprocess_request()
+        context = {}
+        app.update_template_context(context)
+        render = lambda: page.render(context)
+        try:
+            app.jinja_env.fragment_cache = None
+            without = timed(render, rounds)
+        finally:
+            app.jinja_env.fragment_cache = fragment_cache
+        render()
+        return [
+            ('layout', 'base.html, no fragments', without),
+            ('layout', 'base.html, cached nav', timed(render, rounds)),
+        ]
+
+
+HEADER = f"{'part':<8} {'variant':<28} {'n':>5} {'mean ms':>9} {'p50 ms':>8} {'p95 ms':>8}"
+
+def format_row(part, variant, durations):
+    mean = sum(durations) / len(durations)
+    return (f"{part:<8} {variant:<28} {len(durations):>5} {mean * 1000:>9.3f} "
+            f"{percentile(durations, 50) * 1000:>8.3f} {percentile(durations, 95) * 1000:>8.3f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=30)
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--catalog-size', type=int, default=500)
+    args = parser.parse_args(argv)
+
+    app, stub, product_ids, db_path = setup_shop(args.catalog_size, 0.0, 0.0)
+    print(HEADER)
+    try:
+        with app.app_context():
+            for rows in (bench_compile(app, args.rounds), bench_table(app, args.rounds, args.per_page),
+                         bench_layout(app, args.rounds)):
+                for part, variant, durations in rows:
+                    print(format_row(part, variant, durations))
+                sys.stdout.flush()
+    finally:
+        teardown_shop(app, db_path)
+
+
+if __name__ == '__main__':
+    main()
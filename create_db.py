@@ -1,3 +1,10 @@
-from projekt.app import app, db
+# create_db.py
+
+# Legt die Datenbanktabellen an (ohne Server zu starten):
+#     python create_db.py
+
+from projekt import create_app, db
+
+app = create_app()
 with app.app_context():
     db.create_all()
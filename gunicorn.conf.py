@@ -0,0 +1,56 @@
+# gunicorn.conf.py
+
+# Produktionsbetrieb (Linux/macOS):
+#     gunicorn -c gunicorn.conf.py wsgi:app
+# Graceful Reload (neue Worker starten, laufende Requests werden zu Ende bearbeitet):
+#     kill -HUP <pid des gunicorn-Masters>
+
+import multiprocessing
+import os
+
+bind = os.environ.get('SHOP_BIND', '0.0.0.0:8000')
+
+# Prozesse x Threads: ERP-Aufrufe blockieren I/O, daher mehrere Threads pro Worker
+workers = int(os.environ.get('SHOP_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('SHOP_THREADS', 4))
+worker_class = 'gthread'
+
+# App einmal im Master laden, die Worker erben sie per fork()
+preload_app = True
+
+# Ein Checkout kann mehrere ERP-Aufrufe inkl. Retries brauchen (ERP_TIMEOUT = 10s).
+# Beim Reload/Stop bekommen laufende Requests so lange Zeit, bevor ein Worker beendet wird.
+timeout = int(os.environ.get('SHOP_TIMEOUT', 60))
+graceful_timeout = int(os.environ.get('SHOP_GRACEFUL_TIMEOUT', 60))
+keepalive = 5
+
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    from projekt import db, start_scheduler
+    from projekt.scheduler_lock import start_scheduler_once
+    from wsgi import app # Mit preload_app bereits im Master erstellt
+
+    # Keine DB-Verbindungen des Masters im Worker weiterverwenden
+    with app.app_context():
+        db.engine.dispose(close=False)
+    # Scheduler (Outbox, Warenkorb-Bereinigung) nur in EINEM Worker;
+    # der Produkt-Sync läuft im eigenen Prozess: python -m projekt.sync_worker
+    start_scheduler_once(app, start_scheduler)
+
+
+def worker_exit(server, worker):
+    from projekt.services import built_service
+    from wsgi import app
+
+    # Laufende Jobs zu Ende laufen lassen, danach gibt der Prozess den Lock frei
+    scheduler = built_service(app, 'scheduler')
+    if scheduler is not None and scheduler.running:
+        scheduler.shutdown(wait=True)
+
+    # Prozesse des Passwort-Hashings beenden (siehe projekt/passwords.py),
+    # nur falls dieser Worker sie gebraucht hat
+    password_hasher = built_service(app, 'password_hasher')
+    if password_hasher is not None:
+        password_hasher.shutdown()
@@ -3,27 +3,70 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
-from flask_apscheduler import APScheduler # +++ NEU +++
 
-# App und Konfiguration initialisieren
-app = Flask(__name__)
-app.config['SECRET_KEY'] = 'dev-secret-key-change-me'
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///shop.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+from .db_profile import engine_options, init_db_profile
+from .template_cache import init_template_caches
+from .static_assets import init_static_assets
+from .services import get_service
 
-# Datenbank- und Login-Erweiterungen initialisieren
-db = SQLAlchemy(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login' # Name der Login-Funktion/Route
+# Erweiterungen ohne App: create_app() bindet sie an jede neue App-Instanz
+db = SQLAlchemy()
+login_manager = LoginManager()
+login_manager.login_view = 'shop.login' # Name der Login-Funktion/Route (Blueprint 'shop')
 
-# +++ NEU: Scheduler initialisieren (MUSS VOR routes-Import stehen) +++
-scheduler = APScheduler()
-
-# Der User Loader wird hier definiert, da er das User-Modell benötigt
-from .models import User
+# Der User Loader wird hier definiert, da er das User-Modell benötigt.
+# Liefert einen gecachten Snapshot statt einer DB-Abfrage pro Request (siehe projekt/identity_cache.py)
+from .identity_cache import load_identity
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return load_identity(int(user_id))
+
+
+def create_app(config=None):
+    """
+    Erstellt eine neue App-Instanz (Webserver, Sync-Worker, Tests, Benchmarks).
+    'config' überschreibt einzelne Werte aus projekt/config.py.
+    ERP-Client, Caches und Passwort-Hashing werden erst bei der ersten
+    Nutzung gebaut (siehe projekt/services.py), der Scheduler erst von
+    start_scheduler(). Mehrere Instanzen teilen sich keinen Zustand.
+    """
+    app = Flask(__name__)
+    app.config.from_object('projekt.config')
+    app.config.update(config or {})
+    # Verbindungspool passend zur (evtl. überschriebenen) Datenbank-URL
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(
+        app.config['SQLALCHEMY_DATABASE_URI'],
+        pool_size=app.config['DB_POOL_SIZE'],
+        max_overflow=app.config['DB_MAX_OVERFLOW'],
+    ))
+
+    # Datenbank- und Login-Erweiterungen initialisieren
+    db.init_app(app)
+    init_db_profile(app, db)
+    init_template_caches(app)
+    init_static_assets(app)
+    login_manager.init_app(app)
+
+    # Routen (Blueprint) und Instrumentierung (/metrics)
+    from .routes import bp
+    from .metrics import instrument_app
+    instrument_app(app, db)
+    app.register_blueprint(bp)
+    return app
+
+
+def create_scheduler(app):
+    """Der APScheduler der App mit den Jobs aus routes.py, noch nicht gestartet."""
+    # Erst hier importiert: Prozesse ohne Scheduler (alle Worker bis auf einen) sparen den Import
+    from flask_apscheduler import APScheduler
+    from .routes import register_scheduler_jobs
+
+    scheduler = APScheduler()
+    scheduler.init_app(app)
+    register_scheduler_jobs(scheduler, app)
+    return scheduler
+
 
-# Wichtig: Die Routen AM ENDE importieren, NACHDEM alles andere definiert ist
-from . import routes
\ No newline at end of file
+def start_scheduler(app):
+    """Baut und startet den Scheduler der App (Outbox, Warenkorb-Bereinigung)."""
+    get_service(app, 'scheduler', create_scheduler).start()
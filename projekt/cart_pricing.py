@@ -0,0 +1,40 @@
+# projekt/cart_pricing.py
+
+from decimal import Decimal
+
+
+class PricedCart:
+    """
+    Line items, subtotals and total of a cart, computed from the cart lines
+    as loaded by CartStore.lines() (products resolved in ONE query).
+    Shared by the cart page and checkout, so both always price alike.
+
+    items: [{'product', 'product_id', 'quantity', 'unit_price', 'subtotal'}, ...]
+    The plain values are copied at construction: after a commit (e.g. in
+    checkout) the Product instances are expired and every attribute access
+    would reload its row.
+    """
+
+    def __init__(self, lines):
+        self.items = [
+            {'product': p, 'product_id': p.id, 'quantity': qty, 'unit_price': p.price, 'subtotal': p.price * qty}
+            for p, qty in lines
+        ]
+        self.total = sum((item['subtotal'] for item in self.items), Decimal('0.00'))
+
+    def __bool__(self):
+        return bool(self.items)
+
+    def product_ids(self):
+        return [item['product_id'] for item in self.items]
+
+    def erp_items(self):
+        """'items' of the ERP order (deep insert)."""
+        return [
+            {
+                "product_ID": item['product_id'], # The product GUID
+                "quantity": item['quantity'],
+                "itemAmount": str(item['subtotal']) # Field added for ERP
+            }
+            for item in self.items
+        ]
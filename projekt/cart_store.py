@@ -0,0 +1,220 @@
+# projekt/cart_store.py
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from sqlalchemy import select, delete, update
+from sqlalchemy.exc import IntegrityError
+
+from . import db
+from .models import Cart, CartItem, Product
+
+
+class CartStore:
+    """
+    Server-side carts: tables Cart/CartItem (see models.py) with a
+    process-local LRU of {product_id: quantity} per cart in front.
+
+    - Reads (e.g. the item count in base.html) are answered from the LRU
+      for up to 'ttl' seconds; every write goes to the DB and drops the
+      cart from the LRU of this process (the cached copy may be stale).
+      Other processes see the change after at most 'ttl' seconds,
+      lines() (cart page, checkout) always reads the DB.
+    - Writes never compute a quantity from the LRU: add_quantity()
+      increments in SQL, so concurrent adds from several workers add up.
+    - All write methods commit.
+    """
+
+    def __init__(self, max_size=1000, ttl=10):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._carts = OrderedDict() # {cart_id: (loaded_at, {product_id: quantity})}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # --- LRU ---
+
+    def _cached(self, cart_id):
+        with self._lock:
+            entry = self._carts.get(cart_id)
+            if entry is None or time.monotonic() - entry[0] >= self.ttl:
+                self.misses += 1
+                return None
+            self._carts.move_to_end(cart_id)
+            self.hits += 1
+            return dict(entry[1])
+
+    def _remember(self, cart_id, items):
+        with self._lock:
+            self._carts[cart_id] = (time.monotonic(), dict(items))
+            self._carts.move_to_end(cart_id)
+            while len(self._carts) > self.max_size:
+                self._carts.popitem(last=False)
+
+    def _forget(self, *cart_ids):
+        with self._lock:
+            for cart_id in cart_ids:
+                self._carts.pop(cart_id, None)
+
+    # --- Carts ---
+
+    def create(self, user_id=None):
+        cart = Cart(id=uuid.uuid4().hex, user_id=user_id)
+        db.session.add(cart)
+        db.session.commit()
+        self._remember(cart.id, {})
+        return cart.id
+
+    def cart_id_for_user(self, user_id, create=False):
+        """ID of the user's cart (created if 'create'), or None."""
+        cart_id = db.session.execute(select(Cart.id).where(Cart.user_id == user_id)).scalar()
+        if cart_id is None and create:
+            cart_id = self.create(user_id)
+        return cart_id
+
+    def assign_to_user(self, cart_id, user_id):
+        """
+        Called at login: the anonymous cart 'cart_id' becomes the user's cart,
+        or is merged into the user's existing cart (quantities are added up).
+        Returns the ID of the user's cart (None if neither exists).
+        """
+        user_cart_id = self.cart_id_for_user(user_id)
+        anonymous = db.session.get(Cart, cart_id) if cart_id else None
+        if anonymous is None or anonymous.user_id is not None:
+            # No cart yet, or it already belongs to a user (this one or the previous login)
+            return user_cart_id
+
+        if user_cart_id is None:
+            anonymous.user_id = user_id
+            db.session.commit()
+            return anonymous.id
+
+        for item in CartItem.query.filter_by(cart_id=anonymous.id).all():
+            existing = db.session.get(CartItem, (user_cart_id, item.product_id))
+            if existing:
+                existing.quantity += item.quantity
+            else:
+                db.session.add(CartItem(cart_id=user_cart_id, product_id=item.product_id, quantity=item.quantity))
+            db.session.delete(item)
+        db.session.delete(anonymous)
+        db.session.commit()
+        self._forget(anonymous.id, user_cart_id)
+        return user_cart_id
+
+    # --- Items ---
+
+    def items(self, cart_id):
+        """{product_id: quantity} of the cart (a copy, from the LRU if possible)."""
+        if not cart_id:
+            return {}
+        items = self._cached(cart_id)
+        if items is None:
+            rows = db.session.execute(
+                select(CartItem.product_id, CartItem.quantity)
+                .where(CartItem.cart_id == cart_id)
+                .order_by(CartItem.added_at)
+            ).all()
+            items = dict(rows)
+            self._remember(cart_id, items)
+        return items
+
+    def lines(self, cart_id):
+        """
+        Loads the cart with its products in ONE query (plus one DELETE).
+        Returns ([(Product, quantity), ...], number of removed lines): lines
+        whose product no longer exists (deleted by the sync) are removed
+        first, so the loaded products are not expired by that commit.
+        """
+        if not cart_id:
+            return [], 0
+        removed = db.session.execute(
+            delete(CartItem)
+            .where(CartItem.cart_id == cart_id, CartItem.product_id.not_in(select(Product.id)))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if removed:
+            db.session.commit()
+
+        rows = db.session.execute(
+            select(Product, CartItem.quantity)
+            .join(CartItem, CartItem.product_id == Product.id)
+            .where(CartItem.cart_id == cart_id)
+            .order_by(CartItem.added_at)
+        ).all()
+        lines = [(product, quantity) for product, quantity in rows]
+        self._remember(cart_id, {p.id: qty for p, qty in lines})
+        return lines, removed
+
+    def _touch(self, cart_id):
+        """Marks the cart as changed (recreates it if it was purged). Does NOT commit."""
+        if not db.session.query(Cart).filter_by(id=cart_id).update({'updated_at': datetime.utcnow()}):
+            db.session.add(Cart(id=cart_id)) # Anonymous cart purged meanwhile (see purge_anonymous())
+
+    def set_quantity(self, cart_id, product_id, quantity):
+        """Sets the quantity of a line; quantity <= 0 removes it."""
+        self._touch(cart_id)
+        item = db.session.get(CartItem, (cart_id, product_id))
+        if quantity <= 0:
+            if item:
+                db.session.delete(item)
+        elif item:
+            item.quantity = quantity
+        else:
+            db.session.add(CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity))
+        db.session.commit()
+        self._forget(cart_id)
+
+    def add_quantity(self, cart_id, product_id, quantity, max_quantity=None):
+        """
+        Adds 'quantity' to a line (creates it) with an atomic
+        'UPDATE ... SET quantity = quantity + n'.
+        max_quantity: Upper limit of the new quantity (e.g. the ERP stock);
+        the line is left unchanged if it would be exceeded.
+        Returns (added, new quantity - or the wanted one if not added).
+        """
+        line = (CartItem.cart_id == cart_id, CartItem.product_id == product_id)
+        for _ in range(2): # Second round only if the line was inserted concurrently
+            self._touch(cart_id)
+            stmt = update(CartItem).where(*line).values(quantity=CartItem.quantity + quantity)
+            if max_quantity is not None:
+                stmt = stmt.where(CartItem.quantity + quantity <= max_quantity)
+            if db.session.execute(stmt, execution_options={'synchronize_session': False}).rowcount:
+                break
+            current = db.session.execute(select(CartItem.quantity).where(*line)).scalar()
+            if current is not None or (max_quantity is not None and quantity > max_quantity):
+                db.session.rollback()
+                return False, (current or 0) + quantity
+            try:
+                with db.session.begin_nested():
+                    db.session.add(CartItem(cart_id=cart_id, product_id=product_id, quantity=quantity))
+                break
+            except IntegrityError:
+                db.session.rollback() # Line added concurrently -> increment it
+        new_quantity = db.session.execute(select(CartItem.quantity).where(*line)).scalar()
+        db.session.commit()
+        self._forget(cart_id)
+        return True, new_quantity
+
+    def clear(self, cart_id):
+        if not cart_id:
+            return
+        CartItem.query.filter_by(cart_id=cart_id).delete()
+        db.session.commit()
+        self._forget(cart_id)
+
+    def purge_anonymous(self, max_age):
+        """Deletes anonymous carts not changed for 'max_age' (timedelta). Returns their number."""
+        cutoff = datetime.utcnow() - max_age
+        stale = select(Cart.id).where(Cart.user_id.is_(None), Cart.updated_at < cutoff)
+        CartItem.query.filter(CartItem.cart_id.in_(stale)).delete(synchronize_session=False)
+        deleted = Cart.query.filter(Cart.user_id.is_(None), Cart.updated_at < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._carts)}
@@ -0,0 +1,186 @@
+# projekt/catalog.py
+
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from sqlalchemy import text, bindparam
+from sqlalchemy.exc import OperationalError
+
+from . import db
+from .models import Product
+from .services import get_service
+
+
+# --- Full-text search (SQLite FTS5) ---
+
+# Standalone FTS5 table, kept up to date by the product sync
+# (see _upsert_products() / _delete_products() in sync.py).
+# The check result is kept per app (every app may use another database).
+
+class FtsState:
+    """Per-app state of the search index: available = None (not known yet), True or False."""
+
+    def __init__(self, app=None):
+        self.available = None
+        self.lock = threading.Lock()
+
+def _fts_state():
+    return get_service(current_app._get_current_object(), 'fts', FtsState)
+
+def fts_available():
+    """
+    Creates the 'product_fts' virtual table on first use (and fills it from
+    the product table). Returns False if the DB is not SQLite or the SQLite
+    build has no FTS5; search then falls back to LIKE.
+    Other errors (e.g. 'database is locked') are not remembered: the next
+    call checks again.
+    Uses its own connection: call it before db.session has pending writes
+    (perform_erp_sync() does so at its start).
+    """
+    state = _fts_state()
+    if state.available is not None:
+        return state.available
+
+    with state.lock:
+        if state.available is not None:
+            return state.available
+        if db.engine.dialect.name != 'sqlite':
+            state.available = False
+            return False
+        try:
+            with db.engine.begin() as conn:
+                exists = conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'"
+                )).first()
+                if not exists:
+                    conn.execute(text(
+                        "CREATE VIRTUAL TABLE product_fts USING fts5(id UNINDEXED, name, description)"
+                    ))
+                    conn.execute(text(
+                        "INSERT INTO product_fts (id, name, description) "
+                        "SELECT id, name, description FROM product"
+                    ))
+            state.available = True
+        except OperationalError as e:
+            if 'fts5' not in str(e).lower():
+                print(f"FTS5 check failed, product search uses LIKE for now: {e}")
+                return False
+            print(f"FTS5 not available, product search falls back to LIKE: {e}")
+            state.available = False
+    return state.available
+
+def _fts_index_exists():
+    """
+    Like fts_available(), but without creating anything: if the check has
+    not succeeded yet, looks for the table in the current db.session
+    transaction (works while the session has pending writes).
+    """
+    state = _fts_state()
+    if state.available is None and db.engine.dialect.name == 'sqlite':
+        if db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'"
+        )).first():
+            state.available = True
+    return bool(state.available)
+
+def update_product_fts(product_ids):
+    """
+    Re-indexes the given products (deleted products are just removed).
+    Runs in the current db.session transaction. Does NOT commit.
+    """
+    product_ids = list(product_ids)
+    if not product_ids or not _fts_index_exists():
+        return
+    delete_stmt = text("DELETE FROM product_fts WHERE id IN :ids").bindparams(bindparam('ids', expanding=True))
+    insert_stmt = text(
+        "INSERT INTO product_fts (id, name, description) "
+        "SELECT id, name, description FROM product WHERE id IN :ids"
+    ).bindparams(bindparam('ids', expanding=True))
+    for start in range(0, len(product_ids), 500):
+        chunk = product_ids[start:start + 500]
+        db.session.execute(delete_stmt, {'ids': chunk})
+        db.session.execute(insert_stmt, {'ids': chunk})
+
+def _fts_query(search):
+    """
+    Turns user input into a safe FTS5 query: every word becomes a quoted
+    prefix term, all terms must match ('rad hel' -> '"rad"* "hel"*').
+    """
+    words = re.findall(r'\w+', search)
+    return ' '.join(f'"{w}"*' for w in words)
+
+def search_filter(search):
+    """Returns a SQLAlchemy filter for the name/description search."""
+    if fts_available():
+        match = _fts_query(search)
+        if not match:
+            return Product.id.is_(None) # Only special characters -> no hits
+        fts_ids = text("SELECT id FROM product_fts WHERE product_fts MATCH :q").bindparams(q=match)
+        return Product.id.in_(fts_ids.columns(id=db.String))
+    pattern = f"%{search}%"
+    return Product.name.ilike(pattern) | Product.description.ilike(pattern)
+
+
+# --- Rendered page cache ---
+
+class CatalogPageCache:
+    """
+    LRU cache for rendered catalog pages (HTML), keyed by
+    (page, per_page, sort, search). The whole cache is dropped whenever
+    the product sync changed data (invalidate()).
+    The sync runs in the sync worker process: check_shared_version()
+    compares the catalog version it stores in the DB with the one seen
+    last, at most every 'check_interval' seconds.
+    """
+
+    def __init__(self, max_size=256, check_interval=2):
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self.version = 0 # Incremented by every invalidate()
+        self.shared_version = None # Last value of load_version(), e.g. (version, changed_at)
+        self._checked_at = None
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            html = self._pages.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key, html, version):
+        """Stores a page rendered at 'version' (ignored if a sync ran meanwhile)."""
+        with self._lock:
+            if version != self.version:
+                return
+            self._pages[key] = html
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_size:
+                self._pages.popitem(last=False)
+
+    def invalidate(self):
+        with self._lock:
+            self.version += 1
+            self._pages.clear()
+
+    def check_shared_version(self, load_version):
+        """Invalidates the cache if load_version() (the DB's catalog version) changed."""
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        shared_version = load_version()
+        if shared_version != self.shared_version:
+            if self.shared_version is not None or self._pages:
+                self.invalidate()
+            self.shared_version = shared_version
+        # Only now: concurrent first callers must not skip the check and see no version yet
+        self._checked_at = now
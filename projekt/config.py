@@ -0,0 +1,86 @@
+# projekt/config.py
+
+# Standard-Konfiguration der App, geladen von create_app() (projekt/__init__.py).
+# Einzelne Werte lassen sich pro App überschreiben, z.B. für Tests/Benchmarks:
+#     create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:'})
+
+import os
+
+SECRET_KEY = 'dev-secret-key-change-me'
+# SHOP_DATABASE_URL erlaubt eine andere Datenbank (z.B. für Benchmarks)
+SQLALCHEMY_DATABASE_URI = os.environ.get('SHOP_DATABASE_URL', 'sqlite:///shop.db')
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Datenbank-Performance-Profil (siehe projekt/db_profile.py)
+# SQLite: 'tuned' = WAL, synchronous=NORMAL, busy_timeout, mmap, Page-Cache; 'default' = SQLite-Standard
+SQLITE_PROFILE = os.environ.get('SHOP_SQLITE_PROFILE', 'tuned')
+# Verbindungspool (auch für eine Server-Datenbank über SHOP_DATABASE_URL, z.B. postgresql://...)
+# (SQLALCHEMY_ENGINE_OPTIONS baut create_app() daraus passend zur Datenbank-URL)
+DB_POOL_SIZE = int(os.environ.get('SHOP_DB_POOL_SIZE', 10))        # Dauerhaft offene Verbindungen pro Prozess
+DB_MAX_OVERFLOW = int(os.environ.get('SHOP_DB_MAX_OVERFLOW', 10))  # Zusätzliche Verbindungen unter Last
+
+# ERP-Client (siehe projekt/erp_client.py)
+ERP_POOL_CONNECTIONS = 4   # Anzahl gecachter Verbindungspools (Hosts)
+ERP_POOL_MAXSIZE = 16      # Max. offene Verbindungen pro Host
+ERP_MAX_WORKERS = 16       # Threads für parallele ERP-Aufrufe (map/gather)
+ERP_MAX_PER_HOST = 8       # Max. gleichzeitige Requests pro ERP-Host
+ERP_CONNECT_TIMEOUT = 3    # Sekunden für den Verbindungsaufbau (Lese-Timeout: ERP_TIMEOUT in erp.py)
+ERP_RETRIES = 2            # Wiederholungen bei Verbindungsfehlern/502/503/504, keine nach Lese-Timeout
+ERP_BATCH_DEADLINE = 15    # Sekunden für einen parallelen Batch
+ERP_BREAKER_FAILURE_THRESHOLD = 5  # Fehler in Folge, bis ein ERP-Endpunkt gesperrt wird
+ERP_BREAKER_COOL_OFF = 30           # Sekunden Sperre, danach ein Testaufruf (half-open)
+
+# Lagerbestands-Cache vor dem ERP (siehe projekt/stock_cache.py)
+STOCK_CACHE_TTL = 30          # Sekunden, danach "stale" + Hintergrund-Refresh
+STOCK_CACHE_MAX_SIZE = 2000   # Max. Anzahl Produkte (LRU)
+
+# Produktkatalog auf der Startseite (siehe projekt/catalog.py)
+CATALOG_PER_PAGE = 20          # Standard-Seitengröße
+CATALOG_MAX_PER_PAGE = 100     # Obergrenze für ?per_page=
+CATALOG_PAGE_CACHE_SIZE = 256  # Max. Anzahl gecachter Katalogseiten (LRU)
+CATALOG_VERSION_CHECK_SECONDS = 2  # Wie oft ein Webprozess prüft, ob der Sync-Worker den Katalog geändert hat
+
+# Templates (siehe projekt/template_cache.py)
+JINJA_BYTECODE_CACHE = True   # Kompilierte Templates in instance/jinja_cache, Worker starten "warm"
+FRAGMENT_CACHE_SIZE = 5000    # Max. Anzahl gecachter {% cache %}-Fragmente (LRU), 0 = aus
+
+# Statische Dateien (siehe projekt/static_assets.py): URLs mit Inhalts-Hash, vorkomprimiert (gzip/brotli)
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60  # Sekunden Browser-/Proxy-Cache für URLs mit Hash
+STATIC_COMPRESS_MIN_SIZE = 512                 # Kleinere Dateien werden nicht komprimiert
+
+# "My Orders": Seitengröße der an das ERP durchgereichten Pagination ($top/$skip)
+ORDERS_PER_PAGE = 20
+ORDERS_MAX_PER_PAGE = 100
+
+# Cache für "My Orders" (pro Seite) / Bestelldetails aus dem ERP (siehe projekt/order_cache.py)
+ORDER_CACHE_OPEN_TTL = 30            # Sekunden für Listen und offene Bestellungen, danach ETag-Revalidierung
+ORDER_CACHE_TERMINAL_TTL = 60 * 60   # Sekunden für Details abgeschlossener Bestellungen (Status 30/40/-10)
+ORDER_CACHE_MAX_SIZE = 5000          # Max. Anzahl Einträge (LRU)
+
+# Warenkorb serverseitig (siehe projekt/cart_store.py), im Cookie steht nur die Warenkorb-ID
+CART_CACHE_SIZE = 1000          # Max. Anzahl Warenkörbe im Speicher (LRU)
+CART_CACHE_TTL = 10             # Sekunden, danach wird der Warenkorb neu aus der DB gelesen
+CART_ANONYMOUS_MAX_AGE_DAYS = 30  # Anonyme Warenkörbe ohne Änderung danach löschen
+
+# Sync-Worker (python -m projekt.sync_worker, siehe projekt/sync_worker.py)
+SYNC_WORKER_POLL_SECONDS = 2        # Wie oft der Worker nach neuen Sync-Jobs schaut
+SYNC_WORKER_HEARTBEAT_SECONDS = 30  # Lebenszeichen in der DB; älter als 3x => Worker gilt als gestoppt
+
+# Cache für den eingeloggten User (current_user), siehe projekt/identity_cache.py
+USER_CACHE_SIZE = 1000  # Max. Anzahl User pro Prozess (LRU), 0 = aus
+USER_CACHE_TTL = 60     # Sekunden, bis andere Prozesse Änderungen sehen
+
+# Verknüpfung User <-> ERP-Kunde erst nach diesem Intervall erneut im ERP prüfen
+ERP_CUSTOMER_REVALIDATE_SECONDS = 24 * 60 * 60
+
+# Outbox für ERP-Schreibzugriffe (siehe projekt/outbox.py)
+ERP_OUTBOX_INTERVAL_SECONDS = 10  # Wie oft der Scheduler die Outbox abarbeitet
+ERP_OUTBOX_WORKERS = 4            # Parallele ERP-Aufrufe beim Abarbeiten
+ERP_OUTBOX_BATCH_SIZE = 100       # Max. Einträge pro Durchlauf
+
+# Passwort-Hashing (siehe projekt/passwords.py): Verfahren und Kosten in Werkzeug-Notation.
+# Bei einer Änderung werden bestehende Hashes beim nächsten Login neu berechnet.
+PASSWORD_HASH_METHOD = os.environ.get('SHOP_PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+PASSWORD_HASH_WORKERS = int(os.environ.get('SHOP_PASSWORD_HASH_WORKERS', 2))  # Prozesse pro Worker, 0 = im Request-Thread
+PASSWORD_HASH_MAX_PENDING = 32  # Max. wartende Hash-Aufrufe pro Prozess, danach "bitte später erneut"
+PASSWORD_HASH_TIMEOUT = 10      # Sekunden pro Hash-Aufruf
@@ -0,0 +1,65 @@
+# projekt/db_profile.py
+
+"""
+Database performance profile.
+
+- SQLite: PRAGMAs applied to every new connection (WAL, synchronous,
+  busy timeout, mmap, page cache), so concurrent workers/threads can read
+  while one of them writes, and writers wait instead of failing with
+  "database is locked".
+- Engine options (pool size, pre-ping, recycle) for SQLALCHEMY_ENGINE_OPTIONS,
+  also valid for a server database (e.g. postgresql://...) configured via
+  SHOP_DATABASE_URL.
+"""
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+
+# name -> {PRAGMA: value}; 'default' = SQLite's own settings (rollback journal)
+SQLITE_PROFILES = {
+    'tuned': {
+        'journal_mode': 'WAL',        # Readers do not block the writer and vice versa
+        'synchronous': 'NORMAL',      # Safe with WAL, fsync only at checkpoints
+        'busy_timeout': 5000,         # ms to wait for a lock instead of failing
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64 * 1024,     # Negative = KiB, i.e. 64 MiB page cache per connection
+    },
+    'default': {},
+}
+
+
+def is_sqlite(url):
+    return make_url(url).get_backend_name() == 'sqlite'
+
+
+def engine_options(url, pool_size=10, max_overflow=10, pool_timeout=10, pool_recycle=1800):
+    """SQLALCHEMY_ENGINE_OPTIONS for the given database URL."""
+    options = {'pool_pre_ping': True}
+    if is_sqlite(url):
+        if make_url(url).database in (None, '', ':memory:'):
+            return options # In-memory DB: SQLAlchemy's SingletonThreadPool, no pool sizing
+        options.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout)
+        return options
+    options.update(pool_size=pool_size, max_overflow=max_overflow, pool_timeout=pool_timeout,
+                   pool_recycle=pool_recycle)
+    return options
+
+
+def apply_sqlite_pragmas(engine, pragmas):
+    """Registers a 'connect' listener setting the PRAGMAs (no-op for other databases)."""
+    if engine.dialect.name != 'sqlite' or not pragmas:
+        return
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+def init_db_profile(app, db):
+    """Applies the SQLite profile app.config['SQLITE_PROFILE'] to the app's engine."""
+    with app.app_context():
+        apply_sqlite_pragmas(db.engine, SQLITE_PROFILES[app.config['SQLITE_PROFILE']])
@@ -0,0 +1,48 @@
+# projekt/erp.py
+
+# ERP connection settings and the ERP client of the app, shared by the
+# web routes (routes.py) and the product sync (sync.py). The client (session,
+# connection pools, thread pool) is built on first use (see services.py).
+
+from flask import g, has_request_context
+from requests.auth import HTTPBasicAuth
+
+from .erp_client import ErpClient
+from .metrics import get_metrics
+from .services import app_service
+
+
+# --- CONFIGURATION FOR REAL-TIME API (RPC) ---
+ERP_BASE_URL = 'http://localhost:4004/odata/v4/simple-erp'
+ERP_PRODUCTS_URL = f"{ERP_BASE_URL}/Products"
+ERP_CUSTOMERS_URL = f"{ERP_BASE_URL}/Customers"
+ERP_ORDERS_URL = f"{ERP_BASE_URL}/Orders"
+
+ERP_USERNAME = 'alice'
+ERP_PASSWORD = 'alice'
+ERP_AUTH = HTTPBasicAuth(ERP_USERNAME, ERP_PASSWORD)
+ERP_TIMEOUT = 10 # Timeout of 10 seconds for requests
+
+# +++ ERP CLIENT PER APP (session with retry logic, bounded pool, fan-out) +++
+def build_erp_client(app):
+    client = ErpClient(
+        base_url=ERP_BASE_URL,
+        auth=ERP_AUTH, # Assigned to the session (no longer needs to be passed individually)
+        timeout=ERP_TIMEOUT,
+        connect_timeout=app.config['ERP_CONNECT_TIMEOUT'],
+        retries=app.config['ERP_RETRIES'],
+        pool_connections=app.config['ERP_POOL_CONNECTIONS'],
+        pool_maxsize=app.config['ERP_POOL_MAXSIZE'],
+        max_workers=app.config['ERP_MAX_WORKERS'],
+        max_per_host=app.config['ERP_MAX_PER_HOST'],
+        # Circuit breaker per endpoint: fail fast instead of blocking on retries
+        breaker_failure_threshold=app.config['ERP_BREAKER_FAILURE_THRESHOLD'],
+        breaker_cool_off=app.config['ERP_BREAKER_COOL_OFF'],
+        # Identical ERP GETs within one web request are sent only once
+        request_memo=lambda: g.setdefault('_erp_get_memo', {}) if has_request_context() else None,
+    )
+    # Instrumentation of every ERP call -> /metrics
+    client.hooks.append(get_metrics(app).observe_erp_call)
+    return client
+
+erp_client = app_service('erp_client', build_erp_client) # client.session: the underlying requests.Session
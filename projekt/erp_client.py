@@ -0,0 +1,359 @@
+# projekt/erp_client.py
+
+import contextvars
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class ErpDeadlineExceeded(requests.exceptions.Timeout):
+    """
+    A map()/gather() batch did not finish within its deadline.
+    Subclass of requests' Timeout, so existing 'except RequestException'
+    handlers treat it like any other ERP connection problem.
+    """
+
+
+class ErpCircuitOpen(requests.exceptions.ConnectionError):
+    """
+    Raised without any network call while the circuit breaker of an ERP
+    endpoint is open. Subclass of requests' ConnectionError, so existing
+    'except RequestException' handlers take their fallback path.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for ONE ERP endpoint (e.g. 'Products').
+
+    closed:    Calls pass. 'failure_threshold' consecutive failures -> open.
+    open:      Calls fail immediately (ErpCircuitOpen) for 'cool_off' seconds.
+    half_open: After the cool-off ONE trial call passes; success -> closed,
+               failure -> open again. Other calls keep failing fast meanwhile.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, cool_off=30, on_transition=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cool_off = cool_off
+        self.on_transition = on_transition
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def _set_state(self, state):
+        # Call with self._lock held
+        old, self.state = self.state, state
+        if state == self.OPEN:
+            self.opened_at = time.monotonic()
+        if self.on_transition and old != state:
+            self.on_transition(self.name, old, state)
+
+    def before_call(self):
+        """Raises ErpCircuitOpen if the call must not go to the ERP."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cool_off:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+        raise ErpCircuitOpen(f"ERP circuit '{self.name}' is open, call skipped")
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._trial_running = False
+            if self.state != self.CLOSED:
+                self._set_state(self.CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and self.failures >= self.failure_threshold):
+                self._set_state(self.OPEN)
+
+    def release(self):
+        """The call ended without an answer of the ERP either way (e.g. a bug in the caller)."""
+        with self._lock:
+            self._trial_running = False # The next call becomes the trial
+
+
+class _Flight:
+    """One in-flight GET whose response is shared by all identical callers."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.response = None
+        self.error = None
+
+
+class ErpClient:
+    """
+    Wrapper around ONE requests.Session for all ERP calls.
+
+    - Connection pool of configurable size (pool_connections/pool_maxsize).
+      Retries: up to 'retries' for connect errors and 502/503/504 (backoff
+      0.5s), none after a read timeout (a slow ERP would only get more
+      load). Scalar timeouts connect within 'connect_timeout' seconds. So a
+      call against a dead ERP blocks for about retries x connect_timeout,
+      one against a hanging ERP for one read timeout.
+    - At most 'max_per_host' concurrent requests per ERP host.
+    - One CircuitBreaker per endpoint (first path segment after base_url,
+      e.g. 'Products'): while it is open, calls fail in microseconds. A
+      call counts once, however often urllib3 retried it.
+    - GETs are single-flight: identical concurrent GETs (URL + query +
+      headers) share one upstream call. With 'request_memo' (a callable
+      returning a dict for the current web request, or None) results are
+      also memoized for the lifetime of that request; any non-GET call
+      clears the memo.
+    - map()/gather() run requests in parallel on a thread pool of
+      'max_workers' threads, with a deadline per batch.
+    """
+
+    def __init__(self, base_url='', auth=None, timeout=10, connect_timeout=3, retries=2,
+                 pool_connections=4, pool_maxsize=16, max_workers=16, max_per_host=8,
+                 breaker_failure_threshold=5, breaker_cool_off=30, request_memo=None):
+        self.base_url = base_url.rstrip('/')
+        self.request_memo = request_memo
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self.coalesced = 0 # GETs answered by another caller's in-flight call
+        self.memo_hits = 0 # GETs answered from the request memo
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_per_host = max_per_host
+        self.breaker_failure_threshold = breaker_failure_threshold
+        self.breaker_cool_off = breaker_cool_off
+        self._breakers = {}
+        self._breakers_lock = threading.Lock()
+        self.breaker_transitions = Counter() # {(endpoint, from_state, to_state): count}
+        # Called after every call: hook(endpoint, method, response, error, duration)
+        self.hooks = []
+
+        # 1. Define the retry strategy
+        retry_strategy = Retry(
+            total=retries,
+            connect=retries,
+            read=0, # A read timeout is not retried: the ERP got the request and is slow
+            backoff_factor=0.5, # Wait time between attempts (0s, 1s, 2s, ...)
+            status_forcelist=[502, 503, 504], # Retry on these server errors
+        )
+
+        # 2. Create an adapter with this strategy and an explicit pool size
+        #    (pool_maxsize >= parallel requests, otherwise urllib3 discards connections)
+        adapter = HTTPAdapter(
+            max_retries=retry_strategy,
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+        )
+
+        # 3. Create the session, assign auth and mount the adapter
+        self.session = requests.Session()
+        self.session.auth = auth
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        # Requests of map()/gather() ...
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='erp-client')
+        # ... and whole tasks of submit(), which may fan out via map()/gather() themselves
+        self._task_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='erp-task')
+        self._local = threading.local()
+        self._host_limits = {}
+        self._host_limits_lock = threading.Lock()
+
+    # --- Single requests ---
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc
+        with self._host_limits_lock:
+            limit = self._host_limits.get(host)
+            if limit is None:
+                limit = self._host_limits[host] = threading.BoundedSemaphore(self.max_per_host)
+            return limit
+
+    def endpoint(self, url):
+        """ERP endpoint of a URL: 'Products', 'Customers', 'Orders', ..."""
+        path = url[len(self.base_url):] if url.startswith(self.base_url) else urlsplit(url).path
+        return re.split(r'[/?(]', path.lstrip('/'), maxsplit=1)[0] or '-'
+
+    def _record_transition(self, name, old, new):
+        self.breaker_transitions[(name, old, new)] += 1
+        print(f"ERP circuit breaker '{name}': {old} -> {new}")
+
+    def breaker(self, endpoint):
+        with self._breakers_lock:
+            breaker = self._breakers.get(endpoint)
+            if breaker is None:
+                breaker = self._breakers[endpoint] = CircuitBreaker(
+                    endpoint, self.breaker_failure_threshold, self.breaker_cool_off, self._record_transition)
+            return breaker
+
+    def breaker_stats(self):
+        """Current state of every breaker and all state transitions so far."""
+        with self._breakers_lock:
+            breakers = list(self._breakers.values())
+        return {
+            'states': {b.name: b.state for b in breakers},
+            'transitions': [
+                {'endpoint': name, 'from': old, 'to': new, 'count': count}
+                for (name, old, new), count in sorted(self.breaker_transitions.items())
+            ],
+        }
+
+    def request(self, method, url, **kwargs):
+        """
+        Like session.request(), with the default timeout, the per-host limit
+        and the circuit breaker of the endpoint. Connection errors and 5xx
+        answers count as failures; any other exception only ends a
+        half-open trial, so the breaker can never stay stuck in it.
+        """
+        timeout = kwargs.get('timeout', self.timeout)
+        if isinstance(timeout, (int, float)):
+            kwargs['timeout'] = (min(self.connect_timeout, timeout), timeout) # (connect, read)
+        endpoint = self.endpoint(url)
+        breaker = self.breaker(endpoint)
+        started = time.perf_counter()
+        try:
+            breaker.before_call()
+        except ErpCircuitOpen as e:
+            self._call_hooks(endpoint, method, None, e, started)
+            raise
+        try:
+            with self._host_limit(url):
+                response = self.session.request(method, url, **kwargs)
+        except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) as e:
+            breaker.record_failure()
+            self._call_hooks(endpoint, method, None, e, started)
+            raise
+        except BaseException as e: # Also KeyboardInterrupt/SystemExit
+            breaker.release()
+            if isinstance(e, Exception):
+                self._call_hooks(endpoint, method, None, e, started)
+            raise
+        if response.status_code >= 500:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+        self._call_hooks(endpoint, method, response, None, started)
+        return response
+
+    def _call_hooks(self, endpoint, method, response, error, started):
+        duration = time.perf_counter() - started
+        for hook in self.hooks:
+            try:
+                hook(endpoint, method, response, error, duration)
+            except Exception as e:
+                print(f"ERP client hook {getattr(hook, '__name__', hook)} failed: {e}")
+
+    def _memo(self):
+        return self.request_memo() if self.request_memo else None
+
+    def get(self, url, **kwargs):
+        """Idempotent GET: request-memoized and single-flight (see class docstring)."""
+        params = kwargs.get('params') or {}
+        headers = kwargs.get('headers') or {}
+        key = (url, tuple(sorted(dict(params).items())), tuple(sorted(dict(headers).items())))
+
+        memo = self._memo()
+        if memo is not None and key in memo:
+            self.memo_hits += 1
+            return memo[key]
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.response
+
+        try:
+            flight.response = self.request('GET', url, **kwargs)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+        if memo is not None and flight.response.status_code < 500:
+            memo[key] = flight.response
+        return flight.response
+
+    def _mutation(self, method, url, **kwargs):
+        memo = self._memo()
+        if memo is not None:
+            memo.clear() # Reads before this write may be outdated now
+        return self.request(method, url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self._mutation('POST', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self._mutation('PATCH', url, **kwargs)
+
+    # --- Parallel fan-out ---
+
+    def _run_in_pool(self, func, *args, **kwargs):
+        self._local.in_pool = True
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._local.in_pool = False
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Runs func(*args, **kwargs) in the background, returns a Future.
+        func may use map()/gather() itself, but must not use db.session or
+        current_user. It runs in a copy of the caller's context variables,
+        so ERP calls are still attributed to the calling Flask request.
+        """
+        return self._task_executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+    def gather(self, *funcs, deadline=None):
+        """
+        Calls all (argument-less) funcs in parallel and returns their results
+        in order. Raises the first exception of a func, or ErpDeadlineExceeded
+        if not all of them finished within 'deadline' seconds.
+        Called from inside the request pool (nested fan-out), the funcs run
+        serially, so the pool can never deadlock on itself.
+        """
+        if getattr(self._local, 'in_pool', False) or len(funcs) <= 1:
+            return [func() for func in funcs]
+
+        futures = [self._executor.submit(contextvars.copy_context().run, self._run_in_pool, func)
+                   for func in funcs]
+        done, not_done = wait(futures, timeout=deadline)
+        if not_done:
+            for future in not_done:
+                future.cancel()
+            raise ErpDeadlineExceeded(f"{len(not_done)} of {len(futures)} ERP calls exceeded the deadline of {deadline}s")
+        return [future.result() for future in futures]
+
+    def map(self, func, items, deadline=None):
+        """Parallel [func(item) for item in items], see gather()."""
+        return self.gather(*(lambda item=item: func(item) for item in items), deadline=deadline)
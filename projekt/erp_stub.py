@@ -0,0 +1,324 @@
+# projekt/erp_stub.py
+
+"""
+In-process stub of the 'simple-erp' OData service (localhost:4004).
+
+Used by the benchmarks (and for local experiments) instead of the real
+CAP service. ErpStubAdapter is a requests transport adapter: mounted on
+the ERP session, every ERP call is answered in-process, without sockets:
+
+    stub = ErpStubAdapter(catalog_size=500, latency=0.005)
+    with app.app_context():
+        stub.mount(erp.erp_client.session, erp.ERP_BASE_URL)
+
+Supported (only what the shop uses):
+- Products, Customers, Orders: collection and key access 'Set(<id>)'
+- $filter with eq/ne/gt/ge/lt/le/in, combined with 'and'
+- $select, $orderby, $top, $skip, $count=true
+- $expand=items / items($expand=product) on Orders
+- POST Customers, PATCH Customers(<id>), POST Orders with deep insert of
+  'items' (checks and reduces the stock)
+- Configurable latency, error rate (HTTP 503) and server-driven paging
+  (max_page_size -> '@odata.nextLink')
+- Weak ETags on GET answers; 'If-None-Match' with the current ETag -> 304
+"""
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from urllib.parse import urlsplit, parse_qsl
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+def _iso(dt):
+    return dt.strftime('%Y-%m-%dT%H:%M:%S.') + f"{dt.microsecond // 1000:03d}Z"
+
+
+_DATETIME_LITERAL = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:\d{2})')
+
+def _datetime(value):
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+def _literal(raw):
+    """Parses an OData literal: 'text', numbers, DateTimeOffset, everything else (GUIDs) as string."""
+    raw = raw.strip()
+    if _DATETIME_LITERAL.fullmatch(raw):
+        return _datetime(raw)
+    if len(raw) >= 2 and raw[0] == raw[-1] == "'":
+        return raw[1:-1].replace("''", "'")
+    if re.fullmatch(r'-?\d+', raw):
+        return int(raw)
+    if re.fullmatch(r'-?\d+\.\d+', raw):
+        return float(raw)
+    return raw
+
+
+_COMPARE = {
+    'eq': lambda a, b: a == b,
+    'ne': lambda a, b: a != b,
+    'gt': lambda a, b: a is not None and a > b,
+    'ge': lambda a, b: a is not None and a >= b,
+    'lt': lambda a, b: a is not None and a < b,
+    'le': lambda a, b: a is not None and a <= b,
+}
+
+
+def _parse_filter(expression):
+    """Returns a predicate for a (simple) $filter expression."""
+    clauses = []
+    for clause in re.split(r'\s+and\s+', expression.strip()):
+        m = re.fullmatch(r'(\w+)\s+in\s+\((.*)\)', clause.strip())
+        if m:
+            field, values = m.group(1), {_literal(v) for v in m.group(2).split(',') if v.strip()}
+            clauses.append(lambda row, f=field, vs=values: row.get(f) in vs)
+            continue
+        m = re.fullmatch(r'(\w+)\s+(eq|ne|gt|ge|lt|le)\s+(.+)', clause.strip())
+        if not m:
+            raise ValueError(f"Unsupported $filter clause: {clause}")
+        field, op, value = m.group(1), m.group(2), _literal(m.group(3))
+        if isinstance(value, datetime):
+            # DateTimeOffset: compare points in time, not strings of varying precision
+            clauses.append(lambda row, f=field, o=_COMPARE[op], v=value:
+                           o(_datetime(row[f]) if row.get(f) else None, v))
+        else:
+            clauses.append(lambda row, f=field, o=_COMPARE[op], v=value: o(row.get(f), v))
+    return lambda row: all(clause(row) for clause in clauses)
+
+
+class ErpStubAdapter(BaseAdapter):
+    """
+    requests transport adapter answering ERP calls from in-memory data.
+
+    catalog_size:  Number of generated products
+    latency:       Seconds added to every call (simulated network + ERP time)
+    error_rate:    Share of calls (0..1) answered with HTTP 503
+    max_page_size: Server-driven paging of collections (None = off)
+    initial_stock: Stock of every generated product
+    """
+
+    def __init__(self, catalog_size=200, latency=0.0, error_rate=0.0, max_page_size=None,
+                 initial_stock=1_000_000, seed=42):
+        super().__init__()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_page_size = max_page_size
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.calls = Counter()  # {(method, entity_set): count}
+        self.total_calls = 0
+
+        now = datetime.now(timezone.utc)
+        self.products = {}
+        for i in range(catalog_size):
+            guid = str(uuid.uuid5(uuid.NAMESPACE_URL, f"simple-erp/product/{seed}/{i}"))
+            self.products[guid] = {
+                'ID': guid,
+                'productID': f"P-{i:05d}",
+                'name': f"Product {i:05d}",
+                'description': f"Description of product {i:05d}. " * 3,
+                'price': float(Decimal(5 + (i * 37) % 500) + Decimal('0.99')),
+                'stock': initial_stock,
+                'modifiedAt': _iso(now - timedelta(seconds=catalog_size - i)),
+            }
+        self.customers = {}
+        self.orders = {}
+        self._next_order_id = 1
+
+    # --- Setup helpers ---
+
+    def mount(self, session, base_url):
+        """Mounts the stub on a requests.Session for all URLs below base_url."""
+        self.base_path = urlsplit(base_url).path.rstrip('/')
+        session.mount(base_url, self)
+        return self
+
+    def reset_counters(self):
+        with self._lock:
+            self.calls.clear()
+            self.total_calls = 0
+
+    def touch_product(self, guid, **changes):
+        """Changes a product like an ERP user would (updates modifiedAt)."""
+        with self._lock:
+            self.products[guid].update(changes, modifiedAt=_iso(datetime.now(timezone.utc)))
+
+    # --- Transport ---
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        parts = urlsplit(request.url)
+        path = parts.path[len(getattr(self, 'base_path', '')):].lstrip('/')
+        query = dict(parse_qsl(parts.query, keep_blank_values=True))
+        m = re.fullmatch(r'(\w+)(?:\(([^)]*)\))?', path)
+        entity_set = m.group(1) if m else path
+        key = m.group(2) if m else None
+
+        with self._lock:
+            self.calls[(request.method, entity_set)] += 1
+            self.total_calls += 1
+            fail = self.error_rate and self._random.random() < self.error_rate
+
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            return self._response(request, 503, {'error': {'message': 'Service Unavailable (stub)'}})
+
+        body = json.loads(request.body) if request.body else None
+        try:
+            with self._lock:
+                status, payload = self._dispatch(request.method, entity_set, key, query, body)
+        except ValueError as e:
+            status, payload = 400, {'error': {'message': str(e)}}
+
+        if request.method == 'GET' and status == 200:
+            etag = 'W/"' + hashlib.sha1(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()[:16] + '"'
+            if request.headers.get('If-None-Match') == etag:
+                response = self._response(request, 304, None)
+            else:
+                response = self._response(request, status, payload)
+            response.headers['ETag'] = etag
+            return response
+        return self._response(request, status, payload)
+
+    def close(self):
+        pass
+
+    def _response(self, request, status, payload):
+        response = requests.Response()
+        response.status_code = status
+        response._content = json.dumps(payload).encode('utf-8') if payload is not None else b''
+        response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.reason = 'OK' if status < 400 else 'Error'
+        response.elapsed = timedelta(seconds=self.latency)
+        return response
+
+    # --- OData handling (called with self._lock held) ---
+
+    def _dispatch(self, method, entity_set, key, query, body):
+        table = {'Products': self.products, 'Customers': self.customers, 'Orders': self.orders}.get(entity_set)
+        if table is None:
+            return 404, {'error': {'message': f"Unknown entity set {entity_set}"}}
+
+        if method == 'GET':
+            if key is not None:
+                row = table.get(key)
+                if row is None:
+                    return 404, {'error': {'message': 'Not found'}}
+                return 200, self._shape(entity_set, row, query)
+            return 200, self._collection(entity_set, table, query)
+
+        if method == 'POST' and key is None and entity_set == 'Customers':
+            customer = dict(body, ID=str(uuid.uuid4()), modifiedAt=_iso(datetime.now(timezone.utc)))
+            self.customers[customer['ID']] = customer
+            return 201, customer
+
+        if method == 'PATCH' and key is not None and entity_set == 'Customers':
+            if key not in self.customers:
+                return 404, {'error': {'message': 'Not found'}}
+            self.customers[key].update(body, modifiedAt=_iso(datetime.now(timezone.utc)))
+            return 200, self.customers[key]
+
+        if method == 'POST' and key is None and entity_set == 'Orders':
+            return self._create_order(body)
+
+        return 405, {'error': {'message': f"{method} not supported on {entity_set}"}}
+
+    def _create_order(self, body):
+        if body.get('customer_ID') not in self.customers:
+            return 400, {'error': {'message': 'Unknown customer'}}
+        items = body.get('items') or []
+        details = []
+        for item in items:
+            product = self.products.get(item.get('product_ID'))
+            if product is None:
+                details.append({'message': f"Unknown product {item.get('product_ID')}"})
+            elif product['stock'] < item.get('quantity', 0):
+                details.append({'message': f"Insufficient stock for {product['productID']}"})
+        if details:
+            return 400, {'error': {'message': 'Order rejected', 'details': details}}
+
+        now = _iso(datetime.now(timezone.utc))
+        order_guid = str(uuid.uuid4())
+        order_items = []
+        for item in items:
+            self.products[item['product_ID']]['stock'] -= item['quantity']
+            order_items.append({
+                'ID': str(uuid.uuid4()),
+                'order_ID': order_guid,
+                'product_ID': item['product_ID'],
+                'quantity': item['quantity'],
+                'itemAmount': float(item.get('itemAmount', 0)),
+            })
+        order = {
+            'ID': order_guid,
+            'orderID': self._next_order_id,
+            'customer_ID': body['customer_ID'],
+            'orderDate': body.get('orderDate'),
+            'currency_code': body.get('currency_code'),
+            'orderAmount': float(body.get('orderAmount', 0)),
+            'orderStatus_status': 10,
+            'createdAt': now,
+            'modifiedAt': now,
+            'items': order_items,
+        }
+        self._next_order_id += 1
+        self.orders[order_guid] = order
+        return 201, self._shape('Orders', order, {})
+
+    def _collection(self, entity_set, table, query):
+        rows = list(table.values())
+        if '$filter' in query:
+            predicate = _parse_filter(query['$filter'])
+            rows = [row for row in rows if predicate(row)]
+        total = len(rows)
+
+        for part in reversed([p.strip() for p in query.get('$orderby', '').split(',') if p.strip()]):
+            field, _, direction = part.partition(' ')
+            rows.sort(key=lambda row: (row.get(field) is None, row.get(field)), reverse=(direction == 'desc'))
+
+        skip = int(query.get('$skip', 0))
+        top = int(query['$top']) if '$top' in query else None
+        page_size = top
+        if self.max_page_size and (top is None or top > self.max_page_size):
+            page_size = self.max_page_size
+        page = rows[skip:skip + page_size] if page_size is not None else rows[skip:]
+
+        result = {'value': [self._shape(entity_set, row, query) for row in page]}
+        if query.get('$count') == 'true':
+            result['@odata.count'] = total
+        if page_size is not None and page_size != top and skip + page_size < total:
+            next_query = dict(query, **{'$skip': str(skip + page_size)})
+            if top is not None:
+                next_query['$top'] = str(top - page_size)
+            result['@odata.nextLink'] = entity_set + '?' + '&'.join(f"{k}={v}" for k, v in next_query.items())
+        return result
+
+    def _shape(self, entity_set, row, query):
+        """Applies $expand (Orders only) and $select to one row."""
+        expand = query.get('$expand', '')
+        shaped = {k: v for k, v in row.items() if k != 'items'}
+        if entity_set == 'Orders' and expand.startswith('items'):
+            items = []
+            for item in row.get('items', []):
+                item = dict(item)
+                if '$expand=product' in expand:
+                    item['product'] = {k: v for k, v in self.products.get(item['product_ID'], {}).items()}
+                items.append(item)
+            shaped['items'] = items
+        if '$select' in query:
+            fields = {f.strip() for f in query['$select'].split(',')}
+            shaped = {k: v for k, v in shaped.items() if k in fields or k == 'items'}
+        return shaped
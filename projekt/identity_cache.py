@@ -0,0 +1,143 @@
+# projekt/identity_cache.py
+
+"""
+Cached identity for Flask-Login's user_loader.
+
+load_user() used to SELECT the user on every request of a logged-in user,
+mostly just for current_user.is_authenticated in base.html. Instead it
+returns a UserSnapshot (plain copy of the user's columns, no password
+hash, not bound to any DB session) from a per-process LRU:
+
+- Every committed change of a User row (profile edits, ERP customer id,
+  password rehash, ...) drops its snapshot in this process (SQLAlchemy
+  events, see below).
+- Other processes (gunicorn workers) notice the change within 'ttl'
+  seconds; the user who made it at once: the commit stores a new version
+  stamp in their session cookie, snapshots with another stamp are reloaded.
+
+Routes that change the user need the ORM object: current_user_model().
+"""
+
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask import session, has_request_context
+from flask_login import UserMixin, current_user
+from sqlalchemy import event
+from sqlalchemy.orm import object_session
+
+from . import db
+from .models import User
+from .services import app_service
+
+
+IDENTITY_VERSION_KEY = '_identity_version' # Session key of the version stamp
+
+
+class UserSnapshot(UserMixin):
+    """Read-only copy of a User row (without password_hash) for current_user."""
+
+    COLUMNS = tuple(c.key for c in User.__table__.columns if c.key != 'password_hash')
+
+    def __init__(self, user):
+        for name in self.COLUMNS:
+            setattr(self, name, getattr(user, name))
+
+    def __repr__(self):
+        return f"<UserSnapshot {self.id}>"
+
+
+class IdentityCache:
+    """
+    LRU of {user_id: (loaded_at, version stamp, UserSnapshot)}.
+    'generation' is bumped by every invalidate(): a snapshot loaded while
+    an invalidation happened is not stored (put() would resurrect old data).
+    """
+
+    def __init__(self, max_size=1000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, version):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] != version or time.monotonic() - entry[0] >= self.ttl:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, user_id, version, snapshot, generation):
+        with self._lock:
+            if generation != self.generation or self.max_size <= 0:
+                return
+            self._entries[user_id] = (time.monotonic(), version, snapshot)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            self.generation += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+identity_cache = app_service('identity_cache', lambda app: IdentityCache(
+    max_size=app.config['USER_CACHE_SIZE'], ttl=app.config['USER_CACHE_TTL']))
+
+
+def load_identity(user_id):
+    """user_loader: the user's snapshot (cached), None if the user does not exist."""
+    version = session.get(IDENTITY_VERSION_KEY) if has_request_context() else None
+    snapshot = identity_cache.get(user_id, version)
+    if snapshot is not None:
+        return snapshot
+    generation = identity_cache.generation
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    snapshot = UserSnapshot(user)
+    identity_cache.put(user_id, version, snapshot, generation)
+    return snapshot
+
+
+def current_user_model():
+    """The logged-in user as ORM object, for routes that change it (current_user may be a snapshot)."""
+    user = current_user._get_current_object()
+    if isinstance(user, User):
+        return user # e.g. right after login_user()
+    return db.session.get(User, user.id)
+
+
+# --- Invalidation: remember updated users at flush, drop them after the commit ---
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _remember_changed_user(mapper, connection, target):
+    object_session(target).info.setdefault('changed_user_ids', set()).add(target.id)
+
+@event.listens_for(db.session, 'after_commit')
+def _invalidate_changed_users(db_session):
+    user_ids = db_session.info.pop('changed_user_ids', None)
+    if not user_ids:
+        return
+    identity_cache.invalidate(*user_ids)
+    if has_request_context() and session.get('_user_id') and int(session['_user_id']) in user_ids:
+        session[IDENTITY_VERSION_KEY] = uuid.uuid4().hex[:12]
+
+@event.listens_for(db.session, 'after_rollback')
+def _forget_changed_users(db_session):
+    db_session.info.pop('changed_user_ids', None)
@@ -0,0 +1,292 @@
+# projekt/metrics.py
+
+"""
+Minimal Prometheus-style metrics (no extra dependency).
+
+- Counter / Histogram with labels, rendered in the Prometheus text format
+  by Registry.render() (served at /metrics, see routes.py).
+- AppMetrics: the Registry and metrics of one app, kept in app.extensions
+  (get_metrics()); several apps in one process count separately.
+- instrument_app(): per-request timing of ERP calls, SQLAlchemy queries
+  and Jinja rendering (histograms + 'Server-Timing' response header).
+- AppMetrics.observe_erp_call(): hook for the app's ErpClient, records
+  latency, status, retries and bytes per ERP call, tagged with endpoint
+  and Flask route.
+"""
+
+import threading
+import time
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+
+from .services import get_service
+
+
+# Seconds; covers fast in-process calls up to the 10s ERP timeout
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._series = {} # {label values: [bucket counts..., sum, count]}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    """
+    Holds the metrics and 'collectors': callables returning gauge values
+    at scrape time as [(name, documentation, [(labels_dict, value), ...])].
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collector in self.collectors:
+            try:
+                gauges = collector()
+            except Exception as e:
+                print(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+                continue
+            for name, documentation, samples in gauges:
+                lines.append(f"# HELP {name} {documentation}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, value in samples:
+                    lines.append(f"{name}{_labels(labels.keys(), labels.values())} {_number(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# --- Per-request accumulation ---
+
+class RequestStats:
+    """Time/calls of one HTTP request; ERP calls may come from pool threads."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.erp_calls = 0
+        self.erp_seconds = 0.0
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.render_started = []
+        self.lock = threading.Lock()
+
+def current_stats():
+    """RequestStats of the current Flask request, or None (no request / background thread)."""
+    if not has_request_context():
+        return None
+    return g.get('_request_stats')
+
+def current_route():
+    return (request.endpoint or '-') if has_request_context() else '-'
+
+
+# --- Metrics of one app ---
+
+class AppMetrics:
+    """The Registry and the metrics of one app (see get_metrics())."""
+
+    def __init__(self):
+        self.registry = registry = Registry()
+
+        self.http_request_seconds = registry.histogram(
+            'shop_http_request_duration_seconds', 'Duration of HTTP requests.', ('route', 'method', 'status'))
+        self.request_erp_seconds = registry.histogram(
+            'shop_request_erp_seconds', 'ERP time per HTTP request.', ('route',))
+        self.request_erp_calls = registry.histogram(
+            'shop_request_erp_calls', 'ERP calls per HTTP request.', ('route',), buckets=COUNT_BUCKETS)
+        self.request_db_seconds = registry.histogram(
+            'shop_request_db_seconds', 'SQLAlchemy query time per HTTP request.', ('route',))
+        self.request_db_queries = registry.histogram(
+            'shop_request_db_queries', 'SQL statements per HTTP request.', ('route',), buckets=COUNT_BUCKETS)
+        self.request_render_seconds = registry.histogram(
+            'shop_request_render_seconds', 'Jinja rendering time per HTTP request.', ('route',))
+
+        self.erp_call_seconds = registry.histogram(
+            'shop_erp_call_duration_seconds', 'Duration of ERP calls (incl. retries).',
+            ('endpoint', 'method', 'status', 'route'))
+        self.erp_call_retries = registry.counter(
+            'shop_erp_call_retries_total', 'Retries of ERP calls (urllib3 Retry).', ('endpoint', 'method'))
+        self.erp_response_bytes = registry.histogram(
+            'shop_erp_response_bytes', 'Size of ERP response bodies.', ('endpoint', 'method'), buckets=SIZE_BUCKETS)
+
+    def observe_erp_call(self, endpoint, method, response, error, duration):
+        """ErpClient hook: called once per ERP call (also for failed/skipped calls)."""
+        if response is not None:
+            status = str(response.status_code)
+            retries = getattr(getattr(response.raw, 'retries', None), 'history', ()) if response.raw else ()
+            if retries:
+                self.erp_call_retries.inc(len(retries), endpoint=endpoint, method=method)
+            self.erp_response_bytes.observe(len(response.content or b''), endpoint=endpoint, method=method)
+        else:
+            status = type(error).__name__ # e.g. ConnectionError, ErpCircuitOpen
+
+        self.erp_call_seconds.observe(duration, endpoint=endpoint, method=method, status=status,
+                                      route=current_route())
+
+        stats = current_stats()
+        if stats is not None:
+            with stats.lock:
+                stats.erp_calls += 1
+                stats.erp_seconds += duration
+
+    def observe_request(self, stats, response):
+        """Records the RequestStats of a finished request, returns its total duration."""
+        route = current_route()
+        total = time.perf_counter() - stats.started
+        self.http_request_seconds.observe(total, route=route, method=request.method, status=response.status_code)
+        self.request_erp_seconds.observe(stats.erp_seconds, route=route)
+        self.request_erp_calls.observe(stats.erp_calls, route=route)
+        self.request_db_seconds.observe(stats.db_seconds, route=route)
+        self.request_db_queries.observe(stats.db_queries, route=route)
+        self.request_render_seconds.observe(stats.render_seconds, route=route)
+        return total
+
+def get_metrics(app):
+    """The AppMetrics of the app, kept in app.extensions (see services.py)."""
+    return get_service(app, 'metrics', lambda app: AppMetrics())
+
+
+# --- SQLAlchemy: time of every statement (listeners on the app's engine) ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_query_started', []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('_query_started')
+    if not started:
+        return
+    duration = time.perf_counter() - started.pop()
+    stats = current_stats()
+    if stats is not None:
+        with stats.lock:
+            stats.db_queries += 1
+            stats.db_seconds += duration
+
+
+# --- Flask / Jinja ---
+
+def _before_render(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None:
+        stats.render_started.append(time.perf_counter())
+
+def _after_render(sender, template, context, **extra):
+    stats = current_stats()
+    if stats is not None and stats.render_started:
+        started = stats.render_started.pop()
+        if not stats.render_started: # Only count the outermost render_template()
+            stats.render_seconds += time.perf_counter() - started
+
+def instrument_app(app, db):
+    """
+    Creates the metrics of the app (see get_metrics()) and registers the
+    per-request timing hooks on the Flask app and its engine (db.engine).
+    """
+    metrics = get_metrics(app)
+
+    @app.before_request
+    def start_request_stats():
+        g._request_stats = RequestStats()
+
+    @app.after_request
+    def record_request_stats(response):
+        stats = g.pop('_request_stats', None)
+        if stats is None:
+            return response
+        total = metrics.observe_request(stats, response)
+        response.headers['Server-Timing'] = ', '.join([
+            f"erp;dur={stats.erp_seconds * 1000:.1f};desc=\"{stats.erp_calls} calls\"",
+            f"db;dur={stats.db_seconds * 1000:.1f};desc=\"{stats.db_queries} queries\"",
+            f"render;dur={stats.render_seconds * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+        return response
+
+    before_render_template.connect(_before_render, app)
+    template_rendered.connect(_after_render, app)
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
@@ -2,7 +2,7 @@
 
 from . import db
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from .passwords import password_hasher
 from datetime import datetime
 
 class User(db.Model, UserMixin):
@@ -22,11 +22,16 @@ class User(db.Model, UserMixin):
     
     # LÖSCHEN: orders = db.relationship('Order', ...)  <-- Diese Zeile entfernen!
 
+    # Hashing runs in the password process pool (see passwords.py),
+    # may raise PasswordHashingBusy
     def set_password(self, pw):
-        self.password_hash = generate_password_hash(pw)
+        self.password_hash = password_hasher.hash(pw)
 
     def check_password(self, pw):
-        return check_password_hash(self.password_hash, pw)
+        return password_hasher.verify(self.password_hash, pw)
+
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
 
 
 class Product(db.Model):
@@ -37,4 +42,89 @@ class Product(db.Model):
     price = db.Column(db.Numeric(10, 2), nullable=False)
 
 # LÖSCHEN: Class Order ... <-- Die ganze Klasse entfernen!
-# LÖSCHEN: Class OrderItem ... <-- Die ganze Klasse entfernen!
\ No newline at end of file
+# LÖSCHEN: Class OrderItem ... <-- Die ganze Klasse entfernen!
+
+class SyncState(db.Model):
+    """
+    Small key/value store for sync bookkeeping,
+    e.g. the 'modifiedAt' high-water mark of the last product sync.
+    """
+    key = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.String(200), nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class ErpCustomerLink(db.Model):
+    """
+    Last successful check that a user's erp_customer_id exists in the ERP.
+    Separate table (instead of a column on User), so existing databases
+    only need db.create_all() and no migration.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    erp_customer_id = db.Column(db.String(36), nullable=False)
+    verified_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class ErpOutbox(db.Model):
+    """
+    Pending outbound ERP mutation (durable outbox), drained by the
+    'erp_outbox_job' (see projekt/outbox.py).
+    The ERP payload is built from the current user row when the entry is
+    sent, so repeated changes of the same customer need only one entry.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    action = db.Column(db.String(30), nullable=False) # 'create_customer' | 'update_customer'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    # Incremented by every coalesced change: a sent entry is only removed if
+    # no change arrived while it was being sent
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class Cart(db.Model):
+    """
+    Server-side shopping cart (see projekt/cart_store.py).
+    The session cookie only carries the opaque 'id'. Carts of logged-in
+    users have a user_id (at most one per user), so they follow the user
+    across devices; anonymous carts are merged into it at login.
+    """
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), unique=True, nullable=True)
+    updated_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
+
+
+class CartItem(db.Model):
+    """
+    One line of a Cart. product_id has no foreign key on purpose: the
+    product sync may delete products, such lines are dropped when the
+    cart is loaded.
+    """
+    cart_id = db.Column(db.String(32), db.ForeignKey('cart.id'), primary_key=True)
+    product_id = db.Column(db.String(36), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False)
+    added_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+
+class SyncJob(db.Model):
+    """
+    One run of the product sync, queued by /admin/sync or the sync worker's
+    own schedule and executed by the sync worker (python -m projekt.sync_worker).
+    The counts are committed with every page, so /admin/sync/<id> shows
+    the progress of a running job.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    mode = db.Column(db.String(10), nullable=False) # 'delta' | 'full' | 'scan'
+    status = db.Column(db.String(10), nullable=False, default='queued', index=True) # 'queued' | 'running' | 'done' | 'failed'
+    requested_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True) # None = scheduled by the worker
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    pages = db.Column(db.Integer, nullable=False, default=0)
+    created = db.Column(db.Integer, nullable=False, default=0)
+    updated = db.Column(db.Integer, nullable=False, default=0)
+    deleted = db.Column(db.Integer, nullable=False, default=0)
+    errors = db.Column(db.Integer, nullable=False, default=0)
+    message = db.Column(db.Text, nullable=True)
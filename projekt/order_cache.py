@@ -0,0 +1,102 @@
+# projekt/order_cache.py
+
+import threading
+import time
+from collections import OrderedDict
+
+
+# Orders in these states (practically) never change any more:
+# 30 = Shipped, 40 = Completed, -10 = Canceled
+TERMINAL_ORDER_STATUSES = (30, 40, -10)
+
+
+class _Entry:
+    def __init__(self, payload, etag, ttl):
+        self.payload = payload
+        self.etag = etag
+        self.ttl = ttl
+        self.fetched_at = time.monotonic()
+
+
+class OrderCache:
+    """
+    Per-customer cache of ERP order payloads ("My Orders" list and order
+    details) with their ETags.
+
+    - Entries younger than their TTL are served without any ERP call.
+    - Older entries are revalidated with 'If-None-Match'; a 304 answer
+      refreshes the entry without transferring the payload again.
+    - Order details in a terminal state get 'terminal_ttl', open ones
+      'open_ttl'. Lists always get 'open_ttl': new orders can appear in
+      them whatever the state of the listed ones (e.g. placed through
+      another worker or directly in the ERP).
+
+    Keys are tuples starting with the ERP customer ID, e.g.
+    (customer_id, 'list', page, per_page) or (customer_id, 'order', order_id).
+    """
+
+    def __init__(self, open_ttl=30, terminal_ttl=3600, max_size=2000):
+        self.open_ttl = open_ttl
+        self.terminal_ttl = terminal_ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def ttl_for_order(self, order):
+        if order.get('orderStatus_status') in TERMINAL_ORDER_STATUSES:
+            return self.terminal_ttl
+        return self.open_ttl
+
+    def ttl_for_list(self, payload):
+        return self.open_ttl
+
+    def get(self, key, fetch, ttl_for):
+        """
+        Returns (status_code, payload) for 'key'.
+        fetch(headers) performs the ERP GET with the given extra headers and
+        returns the requests.Response; ttl_for(payload) returns the TTL of a
+        fresh payload. payload is None for answers other than 200/304.
+        Exceptions of fetch() are passed on.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                if time.monotonic() - entry.fetched_at < entry.ttl:
+                    self.hits += 1
+                    return 200, entry.payload
+
+        headers = {'If-None-Match': entry.etag} if entry is not None and entry.etag else {}
+        response = fetch(headers)
+
+        if response.status_code == 304 and entry is not None:
+            with self._lock:
+                self.revalidated += 1
+                entry.fetched_at = time.monotonic()
+            return 200, entry.payload
+
+        if response.status_code != 200:
+            return response.status_code, None
+
+        payload = response.json()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = _Entry(payload, response.headers.get('ETag'), ttl_for(payload))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return 200, payload
+
+    def invalidate(self, customer_id, kind=None):
+        """Drops all entries of a customer (or only those of one kind, e.g. 'list')."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == customer_id and (kind is None or k[1] == kind)]:
+                del self._entries[key]
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'revalidated': self.revalidated, 'misses': self.misses,
+                    'size': len(self._entries)}
@@ -0,0 +1,69 @@
+# projekt/outbox.py
+
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, delete
+
+from . import db
+from .models import ErpOutbox
+
+
+# Retry delays: OUTBOX_BACKOFF_BASE_SECONDS * 2^(attempts-1), capped
+OUTBOX_BACKOFF_BASE_SECONDS = 10
+OUTBOX_BACKOFF_MAX_SECONDS = 60 * 60
+
+
+def enqueue_erp_mutation(action, user_id):
+    """
+    Adds an ERP mutation for a user to the outbox. Does NOT commit, so it
+    is written in the same transaction as the local change.
+    An already pending entry with the same action for the same user is
+    reused (coalescing), e.g. several profile edits -> one PATCH.
+    """
+    entry = ErpOutbox.query.filter_by(action=action, user_id=user_id).first()
+    if entry:
+        # Send the latest data as soon as possible; a send already running
+        # for the old version must not remove the entry (see mark_done())
+        entry.next_attempt_at = datetime.utcnow()
+        entry.version = ErpOutbox.version + 1
+        return entry
+    entry = ErpOutbox(action=action, user_id=user_id)
+    db.session.add(entry)
+    return entry
+
+def due_entries(limit):
+    """Returns up to 'limit' entries that are due, oldest first."""
+    return (ErpOutbox.query
+            .filter(ErpOutbox.next_attempt_at <= datetime.utcnow())
+            .order_by(ErpOutbox.id)
+            .limit(limit)
+            .all())
+
+def mark_done(entry, version):
+    """
+    Removes a successfully sent entry, but only if it still has the
+    'version' read before sending.
+    Returns False if the entry was coalesced with a newer change while it
+    was being sent: it stays queued (and due), so the newer data is sent
+    with the next run. Does NOT commit.
+    """
+    result = db.session.execute(
+        delete(ErpOutbox).where(ErpOutbox.id == entry.id, ErpOutbox.version == version),
+        execution_options={'synchronize_session': False},
+    )
+    return result.rowcount == 1
+
+def mark_failed(entry, error):
+    """Schedules the next attempt with exponential backoff. Does NOT commit."""
+    entry.attempts += 1
+    entry.last_error = str(error)[:1000]
+    delay = min(OUTBOX_BACKOFF_BASE_SECONDS * 2 ** (entry.attempts - 1), OUTBOX_BACKOFF_MAX_SECONDS)
+    entry.next_attempt_at = datetime.utcnow() + timedelta(seconds=delay)
+
+def outbox_stats():
+    """Queue depth and age of the oldest pending entry (seconds)."""
+    depth, oldest = db.session.query(func.count(ErpOutbox.id), func.min(ErpOutbox.created_at)).one()
+    return {
+        'depth': depth,
+        'oldest_age_seconds': (datetime.utcnow() - oldest).total_seconds() if oldest else 0.0,
+    }
@@ -0,0 +1,135 @@
+# projekt/passwords.py
+
+"""
+Password hashing off the request threads.
+
+scrypt/pbkdf2 burn tens of milliseconds of CPU per call and hold the GIL
+while doing so, which stalls every other thread of the worker (login
+storms). PasswordHasher runs them in a small process pool instead:
+
+- Method and cost come from app.config['PASSWORD_HASH_METHOD'] in
+  Werkzeug's notation, e.g. 'scrypt:32768:8:1' or 'pbkdf2:sha256:600000'.
+- At most 'max_pending' hash operations are queued per process; beyond
+  that (or after 'timeout' seconds) PasswordHashingBusy is raised instead
+  of piling up requests.
+- needs_rehash() tells whether a stored hash was made with another policy,
+  login then upgrades it (see routes.login()).
+- The pool uses the 'forkserver' start method: its processes are forked
+  from a fresh single-threaded server process, never from the (threaded)
+  web worker, so they cannot inherit locks held by other threads. Like
+  with 'spawn', they import the main module once (not as '__main__'):
+  scripts keep their work under "if __name__ == '__main__':".
+- workers=0 (or no forkserver available, e.g. Windows) hashes inline.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FuturesTimeoutError
+
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+from .services import app_service
+
+
+class PasswordHashingBusy(Exception):
+    """Too many password hash operations queued, the caller should retry later."""
+
+
+def method_prefix(method):
+    """
+    The method with all its parameters, as Werkzeug stores it in front of
+    the salt ('scrypt' -> 'scrypt:32768:8:1'). Same defaults as
+    werkzeug.security; raises ValueError for other methods.
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt':
+        n, r, p = map(int, args) if args else (2 ** 15, 8, 1)
+        return f"scrypt:{n}:{r}:{p}"
+    if name == 'pbkdf2' and len(args) <= 2:
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) == 2 else DEFAULT_PBKDF2_ITERATIONS
+        return f"pbkdf2:{hash_name}:{iterations}"
+    raise ValueError(f"Invalid password hash method '{method}'.")
+
+
+class PasswordHasher:
+
+    def __init__(self, method='scrypt', workers=2, max_pending=32, timeout=10):
+        self.method = method
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._pool = None
+        self._pool_pid = None # The pool belongs to the process that created it (gunicorn forks)
+        self._pending = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+
+    @property
+    def method(self):
+        return self._method
+
+    @method.setter
+    def method(self, method):
+        # Computed once per method, not on the login path
+        self._method_prefix = method_prefix(method)
+        self._method = method
+
+    def _get_pool(self):
+        if self.workers <= 0 or 'forkserver' not in multiprocessing.get_all_start_methods():
+            return None
+        with self._lock:
+            if self._pool is None or self._pool_pid != os.getpid():
+                # The pool processes only need werkzeug.security (the hash functions are
+                # pickled by reference), they never import the app
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload(['werkzeug.security'])
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+                self._pool_pid = os.getpid()
+            return self._pool
+
+    def _run(self, func, *args):
+        pool = self._get_pool()
+        if pool is None:
+            return func(*args)
+        if not self._pending.acquire(blocking=False):
+            raise PasswordHashingBusy()
+        try:
+            future = pool.submit(func, *args)
+        except Exception:
+            self._pending.release()
+            raise
+        future.add_done_callback(lambda f: self._pending.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except FuturesTimeoutError:
+            raise PasswordHashingBusy()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pw_hash, password):
+        return self._run(check_password_hash, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """True if pw_hash was not made with the current method and cost."""
+        return pw_hash.split('$', 1)[0] != self._method_prefix
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=True)
+            self._pool = None
+            self._pool_pid = None
+
+
+def build_password_hasher(app):
+    return PasswordHasher(
+        method=app.config['PASSWORD_HASH_METHOD'],
+        workers=app.config['PASSWORD_HASH_WORKERS'],
+        max_pending=app.config['PASSWORD_HASH_MAX_PENDING'],
+        timeout=app.config['PASSWORD_HASH_TIMEOUT'],
+    )
+
+
+password_hasher = app_service('password_hasher', build_password_hasher)
@@ -0,0 +1,71 @@
+# projekt/scheduler_lock.py
+
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError: # Windows: no fcntl, only single-process serving (run.py) there
+    fcntl = None
+
+
+SCHEDULER_LOCK_FILE = 'scheduler.lock'
+SCHEDULER_LOCK_RETRY_SECONDS = 30
+
+_lock_files = {} # {path: open file}, kept open for the lifetime of the process, closing it releases the lock
+
+
+def try_lock_file(path):
+    """
+    Takes an exclusive, non-blocking lock on 'path' for this process and
+    writes its pid into the file. Returns False if another process holds it.
+    Requires fcntl.
+    """
+    if path in _lock_files:
+        return True
+    handle = open(path, 'a+')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    handle.seek(0)
+    handle.truncate()
+    handle.write(str(os.getpid()))
+    handle.flush()
+    _lock_files[path] = handle
+    return True
+
+
+def start_scheduler_once(app, start, retry_seconds=SCHEDULER_LOCK_RETRY_SECONDS):
+    """
+    Starts the APScheduler with start(app) (projekt.start_scheduler) in
+    exactly ONE process of a multi-process server (gunicorn workers): the
+    process holding an exclusive lock on <instance>/scheduler.lock runs
+    the jobs. The OS releases the lock when
+    that process exits (e.g. graceful reload, worker restart), so every
+    other process keeps retrying in a daemon thread and takes over.
+    Without fcntl the scheduler is started directly.
+    """
+    if fcntl is None:
+        _start(app, start)
+        return
+
+    os.makedirs(app.instance_path, exist_ok=True)
+    path = os.path.join(app.instance_path, SCHEDULER_LOCK_FILE)
+    if try_lock_file(path):
+        _start(app, start)
+        return
+
+    def wait_for_lock():
+        while not try_lock_file(path):
+            time.sleep(retry_seconds)
+        _start(app, start)
+
+    threading.Thread(target=wait_for_lock, name='scheduler-lock', daemon=True).start()
+
+
+def _start(app, start):
+    print(f"Starting the scheduler in process {os.getpid()}")
+    start(app)
@@ -0,0 +1,51 @@
+# projekt/services.py
+
+"""
+Per-app services, built on first use.
+
+create_app() only configures the app. The long-lived objects behind it
+(ERP client, caches, password hasher, scheduler) are created the first
+time the app uses them and stored in app.extensions['shop'], so
+
+- starting a process (gunicorn worker, test, benchmark) does not pay for
+  objects it never uses, e.g. the ERP client of a sync-free test,
+- every app instance has its own ones; several apps can coexist in one
+  process without sharing caches or connection pools.
+
+Modules keep their module-level names as proxies to the instance of the
+current app (they require an app context):
+
+    erp_client = app_service('erp_client', build_erp_client)
+"""
+
+import threading
+
+from flask import current_app
+from werkzeug.local import LocalProxy
+
+
+EXTENSION_KEY = 'shop'
+
+_build_lock = threading.RLock() # Reentrant: a factory may use other services
+
+
+def get_service(app, name, factory):
+    """The service 'name' of the app, built with factory(app) on first use."""
+    services = app.extensions.setdefault(EXTENSION_KEY, {})
+    service = services.get(name)
+    if service is None:
+        with _build_lock:
+            service = services.get(name)
+            if service is None:
+                service = services[name] = factory(app)
+    return service
+
+
+def built_service(app, name):
+    """The service 'name' if the app already built it, else None (e.g. for a shutdown)."""
+    return app.extensions.get(EXTENSION_KEY, {}).get(name)
+
+
+def app_service(name, factory):
+    """Proxy to the service 'name' of current_app (see get_service())."""
+    return LocalProxy(lambda: get_service(current_app._get_current_object(), name, factory))
@@ -0,0 +1,153 @@
+# projekt/static_assets.py
+
+"""
+Static asset pipeline.
+
+- Fingerprinting: url_for('static', filename='style.css') yields
+  /static/style.<hash>.css (first 12 hex digits of the SHA-256 of the
+  content). Every change of the file changes its URL.
+- Precompression: a gzip (and brotli, if the 'brotli' package is
+  installed) variant of every compressible file is written once to
+  <instance>/static_build/ and sent to browsers accepting it.
+- Caching: fingerprinted URLs are served with
+  'Cache-Control: public, max-age=<1 year>, immutable', so browsers and
+  reverse proxies never ask again. Plain /static/<file> URLs (and old
+  fingerprints) are still served, with Flask's default caching.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from flask import request, send_file, send_from_directory
+
+try:
+    import brotli
+except ImportError: # Optional: without it only gzip variants are built
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+FINGERPRINT_RE = re.compile(r'^(?P<stem>.+)\.(?P<hash>[0-9a-f]{12})(?P<ext>\.[^./]+)$')
+
+
+class StaticAsset:
+
+    def __init__(self, filename, path, mtime, digest, mimetype, variants):
+        self.filename = filename
+        self.path = path
+        self.mtime = mtime
+        self.digest = digest
+        self.mimetype = mimetype
+        self.variants = variants # {'br': path, 'gzip': path}
+
+    @property
+    def fingerprinted_name(self):
+        stem, ext = os.path.splitext(self.filename)
+        return f"{stem}.{self.digest}{ext}"
+
+
+class StaticAssets:
+    """Fingerprints and compressed variants of the files in app.static_folder."""
+
+    def __init__(self, static_folder, build_folder, min_size=512):
+        self.static_folder = static_folder
+        self.build_folder = build_folder
+        self.min_size = min_size
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename, check_mtime=False):
+        """
+        The StaticAsset for a file below the static folder (built on first use), or None.
+        check_mtime (debug mode): rebuild it if the file was edited meanwhile.
+        """
+        asset = self._assets.get(filename)
+        if asset is not None and not (check_mtime and self._mtime(asset.path) != asset.mtime):
+            return asset
+        path = os.path.join(self.static_folder, filename)
+        if not os.path.realpath(path).startswith(os.path.realpath(self.static_folder) + os.sep) \
+                or not os.path.isfile(path):
+            return None
+        with self._lock:
+            asset = self._build(filename, path)
+            self._assets[filename] = asset
+        return asset
+
+    def _mtime(self, path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def _build(self, filename, path):
+        mtime = self._mtime(path)
+        with open(path, 'rb') as f:
+            content = f.read()
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+        variants = {}
+        if len(content) >= self.min_size and mimetype.startswith(COMPRESSIBLE_TYPES):
+            target = os.path.join(self.build_folder, digest, filename)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            variants['gzip'] = self._write_once(target + '.gz', lambda: gzip.compress(content, 9, mtime=0))
+            if brotli is not None:
+                variants['br'] = self._write_once(target + '.br', lambda: brotli.compress(content, quality=11))
+        return StaticAsset(filename, path, mtime, digest, mimetype, variants)
+
+    def _write_once(self, target, compress):
+        # Named after the content hash: an existing file is up to date (e.g. built by another worker)
+        if not os.path.exists(target):
+            tmp = f"{target}.{os.getpid()}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(compress())
+            os.replace(tmp, target)
+        return target
+
+
+def init_static_assets(app):
+    """Installs fingerprinted URLs and the precompressing static view on the app."""
+    assets = StaticAssets(app.static_folder, os.path.join(app.instance_path, 'static_build'),
+                          min_size=app.config['STATIC_COMPRESS_MIN_SIZE'])
+    max_age = app.config['STATIC_IMMUTABLE_MAX_AGE']
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint != 'static' or 'filename' not in values:
+            return
+        asset = assets.get(values['filename'], check_mtime=app.debug)
+        if asset is not None:
+            values['filename'] = asset.fingerprinted_name
+
+    def static(filename):
+        """Replacement for Flask's static view (same URL rule)."""
+        match = FINGERPRINT_RE.match(filename)
+        asset = assets.get(match['stem'] + match['ext'], check_mtime=app.debug) if match else None
+        if asset is None or asset.digest != match['hash']:
+            # Plain or outdated URL: the current file with Flask's default caching
+            if asset is not None:
+                filename = asset.filename
+            return send_from_directory(app.static_folder, filename)
+
+        path, encoding = asset.path, None
+        for name in ('br', 'gzip'):
+            if name in asset.variants and request.accept_encodings[name]:
+                path, encoding = asset.variants[name], name
+                break
+        response = send_file(path, mimetype=asset.mimetype, conditional=True,
+                             etag=f"{asset.digest}-{encoding or 'identity'}", max_age=max_age)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if asset.variants:
+            response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions['static'] = static
+    app.extensions['static_assets'] = assets
+    return assets
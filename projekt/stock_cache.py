@@ -0,0 +1,249 @@
+# projekt/stock_cache.py
+
+import contextvars
+import threading
+import time
+from collections import OrderedDict
+
+
+class _Flight:
+    """
+    One in-flight synchronous ERP load for a key.
+    Concurrent callers missing the same key wait on it instead of
+    each calling the ERP themselves.
+    """
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class StockCache:
+    """
+    Process-local stock cache in front of the ERP, keyed by product GUID.
+
+    - Entries younger than 'ttl' seconds are served directly (hit).
+    - Older entries are served as they are (stale) while ONE background
+      refresh per key fetches the current value (stale-while-revalidate).
+      If the ERP is down, the last known value keeps being served.
+    - Unknown keys are loaded synchronously (miss); concurrent misses on
+      the same key share one ERP call.
+    - At most 'max_size' entries are kept, least recently used are evicted.
+
+    'loader(guid)' returns the stock of one product and raises on errors.
+    'bulk_loader(guids)' returns {guid: stock} for all GUIDs it could resolve.
+    """
+
+    def __init__(self, loader, bulk_loader, ttl=30, max_size=2000):
+        self.loader = loader
+        self.bulk_loader = bulk_loader
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._entries = OrderedDict() # {guid: (stock, fetched_at)}
+        self._flights = {}            # {guid: _Flight} synchronous loads
+        self._refreshing = set()      # GUIDs with a running background refresh
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.refreshes = 0
+        self.errors = 0
+
+    # --- Internal helpers (call with self._lock held) ---
+
+    def _store(self, guid, stock):
+        self._entries[guid] = (stock, time.monotonic())
+        self._entries.move_to_end(guid)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _lookup(self, guid, now):
+        """
+        Returns (found, stock). Counts hit/stale and marks
+        stale keys for a background refresh.
+        """
+        entry = self._entries.get(guid)
+        if entry is None:
+            return False, None
+        self._entries.move_to_end(guid)
+        stock, fetched_at = entry
+        if now - fetched_at < self.ttl:
+            self.hits += 1
+        else:
+            self.stale += 1
+        return True, stock
+
+    def _needs_refresh(self, guid, now):
+        entry = self._entries.get(guid)
+        return (entry is not None
+                and now - entry[1] >= self.ttl
+                and guid not in self._refreshing)
+
+    # --- Background refresh ---
+
+    def _refresh_in_background(self, guids):
+        """Starts one daemon thread refreshing the given (stale) GUIDs."""
+        if not guids:
+            return
+
+        def run():
+            try:
+                result = self.bulk_loader(guids)
+                with self._lock:
+                    self.refreshes += 1
+                    for guid, stock in result.items():
+                        self._store(guid, stock)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"Stock-Cache background refresh failed for {len(guids)} products: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.difference_update(guids)
+
+        # In a copy of the caller's context: the loader needs its Flask app context (ERP client of the app)
+        threading.Thread(target=contextvars.copy_context().run, args=(run,),
+                         name='stock-cache-refresh', daemon=True).start()
+
+    # --- Public API ---
+
+    def get(self, guid, fresh=False):
+        """
+        Returns the stock for one GUID.
+        fresh=True bypasses the cache (e.g. for checkout) and stores the result.
+        Raises the loader's exception if nothing is cached and the ERP call fails.
+        """
+        if fresh:
+            stock = self.loader(guid)
+            with self._lock:
+                self._store(guid, stock)
+            return stock
+
+        with self._lock:
+            now = time.monotonic()
+            found, stock = self._lookup(guid, now)
+            if found:
+                if self._needs_refresh(guid, now):
+                    self._refreshing.add(guid)
+                    refresh = [guid]
+                else:
+                    refresh = []
+            else:
+                self.misses += 1
+                flight = self._flights.get(guid)
+                leader = flight is None
+                if leader:
+                    flight = self._flights[guid] = _Flight()
+
+        if found:
+            self._refresh_in_background(refresh)
+            return stock
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = self.loader(guid)
+            with self._lock:
+                self._store(guid, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(guid, None)
+            flight.event.set()
+
+    def get_many(self, guids, fresh=False):
+        """
+        Returns {guid: stock} for all GUIDs that are cached or could be loaded.
+        Missing keys are loaded with ONE bulk_loader call; GUIDs the ERP could
+        not resolve are left out of the result (the caller picks a default).
+        """
+        guids = list(dict.fromkeys(guids))
+        result = {}
+
+        if fresh:
+            loaded = self.bulk_loader(guids)
+            with self._lock:
+                for guid, stock in loaded.items():
+                    self._store(guid, stock)
+            return loaded
+
+        to_load = []
+        waiting = {}
+        refresh = []
+        with self._lock:
+            now = time.monotonic()
+            for guid in guids:
+                found, stock = self._lookup(guid, now)
+                if found:
+                    result[guid] = stock
+                    if self._needs_refresh(guid, now):
+                        self._refreshing.add(guid)
+                        refresh.append(guid)
+                    continue
+                self.misses += 1
+                flight = self._flights.get(guid)
+                if flight is None:
+                    self._flights[guid] = _Flight()
+                    to_load.append(guid)
+                else:
+                    waiting[guid] = flight
+
+        self._refresh_in_background(refresh)
+
+        if to_load:
+            try:
+                loaded = self.bulk_loader(to_load)
+            except Exception as e:
+                loaded = {}
+                with self._lock:
+                    self.errors += 1
+                print(f"Stock-Cache bulk load failed for {len(to_load)} products: {e}")
+            with self._lock:
+                for guid in to_load:
+                    flight = self._flights.pop(guid)
+                    if guid in loaded:
+                        flight.value = loaded[guid]
+                        self._store(guid, flight.value)
+                        result[guid] = flight.value
+                    else:
+                        flight.error = LookupError(guid)
+                    flight.event.set()
+
+        for guid, flight in waiting.items():
+            flight.event.wait()
+            if flight.error is None:
+                result[guid] = flight.value
+
+        return result
+
+    def invalidate(self, guids=None):
+        """Drops the given GUIDs (or everything) from the cache."""
+        with self._lock:
+            if guids is None:
+                self._entries.clear()
+            else:
+                for guid in guids:
+                    self._entries.pop(guid, None)
+
+    def stats(self):
+        """Returns the hit/miss/stale counters and the current size."""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'refreshes': self.refreshes,
+                'errors': self.errors,
+                'size': len(self._entries),
+            }
@@ -0,0 +1,545 @@
+# projekt/sync.py
+
+"""
+Product sync ERP -> local product table.
+
+Runs in the sync worker process (python -m projekt.sync_worker, see
+sync_worker.py), not in the web processes: /admin/sync only queues a
+SyncJob. Web processes learn about changed data through the catalog
+version stored in SyncState (see bump_catalog_version()).
+"""
+
+import importlib
+import uuid
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from urllib.parse import urljoin
+
+import requests
+from sqlalchemy import select, delete
+
+from . import db
+from .models import Product, SyncState, SyncJob
+from .catalog import fts_available, update_product_fts
+from .erp import erp_client, ERP_BASE_URL, ERP_PRODUCTS_URL, ERP_TIMEOUT
+
+
+# --- AUTOMATED SYNC LOGIC ---
+
+# SyncState key of the 'modifiedAt' high-water mark of the last product sync
+SYNC_MARK_KEY = 'products_modified_at'
+# A delta sync re-reads products modified this long before the mark: rows with the
+# same timestamp as the mark, or committed late by the ERP, are not missed. The
+# diff in reconcile_erp_products() drops the rows that did not change.
+ERP_SYNC_OVERLAP_SECONDS = 5
+ERP_SYNC_MINUTES = 5       # Interval of the (delta) product sync
+ERP_KEY_SCAN_MINUTES = 60  # Interval of the deletion scan ($select=ID)
+
+# Columns written by the sync (besides the primary key 'id')
+PRODUCT_SYNC_COLUMNS = ('name', 'description', 'price', 'product_str_id')
+SYNC_WRITE_CHUNK_SIZE = 150 # Rows per INSERT/DELETE (5 bind params per row, SQLite limit: 999 on old builds)
+SYNC_READ_CHUNK_SIZE = 900  # IDs per 'WHERE id IN (...)' lookup
+ERP_SYNC_PAGE_SIZE = 1000 # Products per '$top'/'$skip' page (bounds the memory of a sync)
+
+def get_sync_state(key):
+    state = db.session.get(SyncState, key)
+    return state.value if state else None
+
+def set_sync_state(key, value):
+    state = db.session.get(SyncState, key)
+    if state:
+        state.value = value
+    else:
+        db.session.add(SyncState(key=key, value=value))
+
+# SyncState key of the catalog version: changes whenever the sync changed products.
+# Every web process compares it with the version of its rendered catalog pages.
+CATALOG_VERSION_KEY = 'catalog_version'
+
+def get_catalog_version():
+    """(version, time of the last change) of the catalog, (None, None) before the first change."""
+    state = db.session.get(SyncState, CATALOG_VERSION_KEY)
+    return (state.value, state.updated_at) if state else (None, None)
+
+def bump_catalog_version():
+    """Makes all web processes drop their rendered catalog pages. Commits."""
+    set_sync_state(CATALOG_VERSION_KEY, uuid.uuid4().hex)
+    db.session.commit()
+
+def parse_erp_timestamp(value):
+    """
+    Parses an ERP 'modifiedAt' (ISO 8601, e.g. '2024-05-01T12:00:00.5Z') to an
+    aware UTC datetime. Returns None for empty or invalid values.
+    """
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def format_erp_timestamp(value):
+    """Formats an aware datetime as an OData DateTimeOffset ('...T12:00:00.500000Z')."""
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+def _erp_product_page_url(skip, page_size, modified_since=None, select=None):
+    """Builds the URL of one '$top'/'$skip' page of the ERP product catalog."""
+    query = [f"$top={page_size}", f"$skip={skip}"]
+    if modified_since:
+        # OData v4: DateTimeOffset literals are not quoted
+        query.append(f"$filter=modifiedAt ge {modified_since}")
+        query.append("$orderby=modifiedAt,ID")
+    else:
+        query.append("$orderby=ID") # Stable order, otherwise $skip pages can overlap
+    if select:
+        query.append(f"$select={select}")
+    return f"{ERP_PRODUCTS_URL}?{'&'.join(query)}"
+
+def iter_erp_product_pages(modified_since=None, select=None, page_size=None):
+    """
+    Generator: Reads the ERP product catalog page by page.
+    - Requests '$top'/'$skip' pages of 'page_size' products (ERP_SYNC_PAGE_SIZE).
+    - Follows '@odata.nextLink' if the ERP pages on its own (server-driven paging).
+    modified_since: Only products with 'modifiedAt' >= this ISO timestamp (delta).
+    select: Optional '$select' (e.g. 'ID' for a key scan).
+    Yields one list of product rows per page, so only one page is held in memory.
+    Raises requests exceptions on errors (the caller must not treat the
+    catalog as complete in that case).
+    """
+    page_size = page_size or ERP_SYNC_PAGE_SIZE
+    skip = 0
+    window_rows = 0 # Rows of the current '$skip' window (over its whole nextLink chain)
+    url = _erp_product_page_url(skip, page_size, modified_since, select)
+
+    while url:
+        response = erp_client.get(url, timeout=ERP_TIMEOUT)
+        response.raise_for_status()
+        data = response.json()
+        page = data.get('value', [])
+        next_link = data.get('@odata.nextLink')
+        del data, response
+
+        window_rows += len(page)
+        if page:
+            yield page
+
+        if next_link:
+            # nextLink may be relative to the service root
+            url = urljoin(f"{ERP_BASE_URL}/", next_link)
+        elif window_rows >= page_size:
+            # Window complete (the ERP may have split it into smaller pages)
+            skip += window_rows
+            window_rows = 0
+            url = _erp_product_page_url(skip, page_size, modified_since, select)
+        else:
+            url = None # Last (partial) window
+
+def fetch_erp_product_count():
+    """
+    Number of products in the ERP ('$count=true', no rows).
+    Raises requests exceptions on errors.
+    """
+    response = erp_client.get(f"{ERP_PRODUCTS_URL}?$top=0&$count=true", timeout=ERP_TIMEOUT)
+    response.raise_for_status()
+    count = response.json().get('@odata.count')
+    if count is None:
+        raise requests.exceptions.InvalidJSONError("ERP answer without '@odata.count'")
+    return int(count)
+
+def check_erp_ids_complete(erp_ids):
+    """
+    Guard before deletions: Returns None if at least as many product IDs were
+    read as the ERP reports, otherwise an error message (nothing must be deleted).
+    Raises requests exceptions on errors.
+    """
+    erp_count = fetch_erp_product_count()
+    if len(erp_ids) < erp_count:
+        return (f"Read only {len(erp_ids)} of {erp_count} ERP product IDs "
+                f"(incomplete catalog), no deletions.")
+    return None
+
+def fetch_erp_product_ids():
+    """
+    Lightweight key scan: Downloads only the IDs of all ERP products (paged).
+    Raises requests exceptions on errors.
+    """
+    erp_ids = set()
+    for page in iter_erp_product_pages(select='ID'):
+        erp_ids.update(item['ID'] for item in page if item.get('ID'))
+    return erp_ids
+
+def _chunks(values, size):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+def _delete_products(product_ids):
+    """
+    Deletes products with chunked 'DELETE ... WHERE id IN (...)' statements.
+    Does NOT commit. Returns the number of deleted products.
+    """
+    deleted_count = 0
+    for chunk in _chunks(product_ids, SYNC_WRITE_CHUNK_SIZE):
+        result = db.session.execute(
+            delete(Product).where(Product.id.in_(chunk)),
+            execution_options={'synchronize_session': False},
+        )
+        deleted_count += result.rowcount
+    update_product_fts(product_ids)
+    return deleted_count
+
+# Dialects with 'INSERT ... ON CONFLICT DO UPDATE' (sqlalchemy.dialects.<name>.insert,
+# imported on first use: web processes never need the PostgreSQL dialect)
+UPSERT_DIALECTS = ('sqlite', 'postgresql')
+
+def _upsert_products(rows):
+    """
+    Writes product rows with bulk 'INSERT ... ON CONFLICT (id) DO UPDATE'
+    statements (chunked), on other databases row by row via merge().
+    Does NOT commit.
+    """
+    dialect = db.engine.dialect.name
+    insert = importlib.import_module(f"sqlalchemy.dialects.{dialect}").insert if dialect in UPSERT_DIALECTS else None
+    for chunk in _chunks(rows, SYNC_WRITE_CHUNK_SIZE):
+        if insert is None:
+            for row in chunk:
+                db.session.merge(Product(**row))
+            continue
+        stmt = insert(Product).values(chunk)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Product.id],
+            set_={col: stmt.excluded[col] for col in PRODUCT_SYNC_COLUMNS},
+        )
+        db.session.execute(stmt)
+    update_product_fts(row['id'] for row in rows)
+
+def _load_existing_products(guids):
+    """
+    Loads (id, name, description, price, product_str_id) tuples of the
+    given local products in ONE query (per chunk of SYNC_READ_CHUNK_SIZE IDs).
+    Returns {id: row}.
+    """
+    columns = [Product.id] + [getattr(Product, col) for col in PRODUCT_SYNC_COLUMNS]
+    existing = {}
+    for chunk in _chunks(guids, SYNC_READ_CHUNK_SIZE):
+        for row in db.session.execute(select(*columns).where(Product.id.in_(chunk))):
+            existing[row.id] = row
+    return existing
+
+def delete_products_missing_in_erp(erp_ids):
+    """
+    Deletes local (GUID) products that are no longer in the ERP.
+    Does NOT commit. Returns the number of deleted products.
+    """
+    local_ids = db.session.scalars(
+        select(Product.id).where(Product.id.like('________-____-____-____-____________'))
+    )
+    return _delete_products([pid for pid in local_ids if pid not in erp_ids])
+
+def reconcile_erp_products(erp_products):
+    """
+    Set-based reconcile of the local products with a list (page) of ERP
+    product rows: Loads the existing rows in one query, computes the
+    insert/update diffs in memory and only writes rows that actually changed.
+    Deletions are NOT handled here (see delete_products_missing_in_erp()),
+    because one page never is the complete catalog.
+    Does NOT commit.
+    Returns (created, updated, errors, erp_ids, max_modified_at), max_modified_at
+    as a datetime (see parse_erp_timestamp()) or None.
+    """
+    errors_count = 0
+    max_modified_at = None
+    erp_rows = {}
+
+    for item in erp_products:
+        try:
+            # Logic for parsing 'item'
+            prod_guid = item.get('ID')
+            name = item.get('name')
+            price_raw = item.get('price')
+            
+            if not prod_guid or not name or price_raw is None:
+                print(f"Skipped: Incomplete data in row: {item}")
+                errors_count += 1
+                continue
+
+            # Compared as datetimes: the ERP may vary the fractional-second digits
+            modified_at = parse_erp_timestamp(item.get('modifiedAt'))
+            if modified_at and (max_modified_at is None or modified_at > max_modified_at):
+                max_modified_at = modified_at
+
+            erp_rows[prod_guid] = {
+                'id': prod_guid,
+                'name': name,
+                'description': item.get('description') or '',
+                'price': Decimal(str(price_raw)),
+                'product_str_id': item.get('productID'),
+            }
+        except Exception as e:
+            print(f"Error processing product {item.get('ID')}: {e}")
+            errors_count += 1
+
+    existing = _load_existing_products(erp_rows.keys())
+
+    # --- Diff in memory ---
+    created_count = 0
+    updated_count = 0
+    changed_rows = []
+    for prod_guid, row in erp_rows.items():
+        old = existing.get(prod_guid)
+        if old is None:
+            created_count += 1
+        elif ((old.name, old.description or '', old.price, old.product_str_id)
+              == tuple(row[col] for col in PRODUCT_SYNC_COLUMNS)):
+            continue # Unchanged -> no write at all
+        else:
+            updated_count += 1
+        changed_rows.append(row)
+
+    # --- Apply ---
+    _upsert_products(changed_rows)
+
+    return created_count, updated_count, errors_count, set(erp_rows), max_modified_at
+
+def _update_job(job, **fields):
+    """Writes progress/result fields to the SyncJob (if any). Does NOT commit."""
+    if job is None:
+        return
+    for name, value in fields.items():
+        setattr(job, name, value)
+
+def _finish_job(job, status, message):
+    """Marks the SyncJob as done/failed and commits. Returns the message."""
+    if job is not None:
+        _update_job(job, status=status, message=message, finished_at=datetime.utcnow())
+        db.session.commit()
+    return message
+
+def perform_erp_sync(mode='delta', job=None):
+    """
+    The actual sync logic.
+    Called by the sync worker (or directly, e.g. by the benchmarks).
+    Returns a status string.
+
+    mode='delta': Only downloads products changed since the stored
+                  'modifiedAt' high-water mark. Deletions are handled by
+                  perform_erp_deletion_scan(). Falls back to 'full' if no
+                  high-water mark is stored yet.
+    mode='full':  Downloads the whole catalog, deletes local products
+                  missing in the ERP and resets the high-water mark.
+
+    The catalog is read and reconciled page by page (ERP_SYNC_PAGE_SIZE),
+    each page is committed on its own. Deletions and the new high-water
+    mark are only written after ALL pages were read successfully.
+    job: Optional SyncJob; its progress counts are committed with every
+    page and it is marked done/failed at the end.
+    
+    IMPORTANT: This function requires an active app context!
+    The caller (worker or script) must provide 'with app.app_context():'.
+    """
+    
+    mark = get_sync_state(SYNC_MARK_KEY) if mode == 'delta' else None
+    if mode == 'delta' and not mark:
+        mode = 'full'
+
+    print(f"[{datetime.now()}] Starting ERP-API-Sync ({mode})...")
+    fts_available() # Create the search index BEFORE this session starts writing
+
+    pages_count = 0
+    created_count = 0
+    updated_count = 0
+    errors_count = 0
+    deleted_count = 0
+    erp_ids_from_sync = set()
+    mark_at = parse_erp_timestamp(mark)
+    max_modified_at = mark_at
+    modified_since = (format_erp_timestamp(mark_at - timedelta(seconds=ERP_SYNC_OVERLAP_SECONDS))
+                      if mark_at else None)
+
+    try:
+        # --- 1. Fetch products from ERP endpoint (page by page) ---
+        # --- 2. Reconcile local DB with each page ---
+        for page in iter_erp_product_pages(modified_since=modified_since):
+            created, updated, errors, _, page_max_modified_at = reconcile_erp_products(page)
+
+            pages_count += 1
+            created_count += created
+            updated_count += updated
+            errors_count += errors
+            _update_job(job, pages=pages_count, created=created_count, updated=updated_count, errors=errors_count)
+            db.session.commit()
+
+            if mode == 'full':
+                # All IDs read, also of skipped (incomplete) rows: they still exist in the ERP
+                erp_ids_from_sync.update(item['ID'] for item in page if item.get('ID'))
+            if page_max_modified_at and (max_modified_at is None or page_max_modified_at > max_modified_at):
+                max_modified_at = page_max_modified_at
+
+    except requests.exceptions.RequestException as e:
+        db.session.rollback()
+        if created_count or updated_count:
+            bump_catalog_version() # Pages read so far are committed
+        return _finish_job(job, 'failed', (
+            f"Error (API): During download of product data: {e} "
+            f"(Pages read so far: Created: {created_count}, Updated: {updated_count}; no deletions)"))
+    except Exception as e:
+        db.session.rollback()
+        if created_count or updated_count:
+            bump_catalog_version()
+        return _finish_job(job, 'failed', f"Error (DB) during import or DB-Update: {e}")
+
+    if mode == 'full' and not erp_ids_from_sync:
+        return _finish_job(job, 'failed', "ERP-Sync: Could not receive products from ERP (empty list).")
+
+    if mode == 'full':
+        try:
+            incomplete = check_erp_ids_complete(erp_ids_from_sync)
+        except requests.exceptions.RequestException as e:
+            incomplete = f"Error (API): During product count: {e}, no deletions."
+        if incomplete:
+            if created_count or updated_count:
+                bump_catalog_version() # Pages read so far are committed
+            return _finish_job(job, 'failed', (
+                f"ERP-Sync ({mode}): {incomplete} "
+                f"(Created: {created_count}, Updated: {updated_count})"))
+
+    try:
+        # --- 3. (full sync only) Delete local products that are no longer in the ERP ---
+        if mode == 'full':
+            deleted_count = delete_products_missing_in_erp(erp_ids_from_sync)
+            _update_job(job, deleted=deleted_count)
+
+        # --- 4. Move the high-water mark forward ---
+        if max_modified_at and max_modified_at != mark_at:
+            set_sync_state(SYNC_MARK_KEY, format_erp_timestamp(max_modified_at))
+
+        # --- 5. Write changes to the DB ---
+        db.session.commit()
+        if created_count or updated_count or deleted_count:
+            bump_catalog_version()
+        return _finish_job(job, 'done', f"ERP-API-Sync ({mode}) successful! Created: {created_count}, Updated: {updated_count}, Deleted: {deleted_count}, Errors: {errors_count}")
+
+    except Exception as e:
+        db.session.rollback()
+        return _finish_job(job, 'failed', f"Error (DB) during import or DB-Update: {e}")
+
+def perform_erp_deletion_scan(job=None):
+    """
+    Deletes local products that no longer exist in the ERP.
+    Only downloads the product IDs ($select=ID), so it is much cheaper
+    than a full sync and can run on its own (slower) schedule.
+    Requires an active app context, like perform_erp_sync().
+    """
+    fts_available() # Create the search index BEFORE this session starts writing
+    try:
+        erp_ids = fetch_erp_product_ids()
+        if not erp_ids:
+            return _finish_job(job, 'failed', "ERP-Deletion-Scan: Could not receive product IDs from ERP (empty list).")
+        incomplete = check_erp_ids_complete(erp_ids)
+        if incomplete:
+            return _finish_job(job, 'failed', f"ERP-Deletion-Scan: {incomplete}")
+    except requests.exceptions.RequestException as e:
+        return _finish_job(job, 'failed', f"Error (API): During download of product IDs: {e}")
+
+    try:
+        deleted_count = delete_products_missing_in_erp(erp_ids)
+        _update_job(job, deleted=deleted_count)
+        db.session.commit()
+        if deleted_count:
+            bump_catalog_version()
+        return _finish_job(job, 'done', f"ERP-Deletion-Scan successful! Deleted: {deleted_count}")
+    except Exception as e:
+        db.session.rollback()
+        return _finish_job(job, 'failed', f"Error (DB) during deletion scan: {e}")
+
+
+# --- SYNC JOBS (queue in the DB, executed by the sync worker) ---
+
+# 'scan' = deletion scan (perform_erp_deletion_scan)
+SYNC_JOB_MODES = ('delta', 'full', 'scan')
+
+def enqueue_sync_job(mode, user_id=None):
+    """
+    Queues a sync run. An already queued job of the same mode is reused
+    (e.g. several clicks on "Sync ERP" -> one run). Does NOT commit.
+    """
+    job = SyncJob.query.filter_by(mode=mode, status='queued').first()
+    if job:
+        return job
+    job = SyncJob(mode=mode, requested_by=user_id)
+    db.session.add(job)
+    return job
+
+def has_pending_sync_job(mode):
+    return SyncJob.query.filter(SyncJob.mode == mode, SyncJob.status.in_(('queued', 'running'))).first() is not None
+
+def claim_next_sync_job():
+    """
+    Marks the oldest queued job as running and commits. Returns it, or None
+    if nothing is queued or a job is still running (one sync at a time).
+    """
+    if SyncJob.query.filter_by(status='running').first():
+        return None
+    job = SyncJob.query.filter_by(status='queued').order_by(SyncJob.id).first()
+    if job is None:
+        return None
+    job.status = 'running'
+    job.started_at = datetime.utcnow()
+    db.session.commit()
+    return job
+
+def fail_interrupted_sync_jobs():
+    """Marks jobs left 'running' by a crashed/killed worker as failed. Commits."""
+    interrupted = SyncJob.query.filter_by(status='running').all()
+    for job in interrupted:
+        _update_job(job, status='failed', message='Interrupted (sync worker stopped)', finished_at=datetime.utcnow())
+    db.session.commit()
+    return len(interrupted)
+
+def run_sync_job(job):
+    """
+    Executes a claimed job. Returns the status message.
+    An unexpected error rolls back and marks the job failed (with finished_at). Commits.
+    """
+    job_id = job.id
+    try:
+        if job.mode == 'scan':
+            return perform_erp_deletion_scan(job=job)
+        return perform_erp_sync(mode=job.mode, job=job)
+    except Exception as e:
+        db.session.rollback()
+        return _finish_job(db.session.get(SyncJob, job_id), 'failed', f"Error during sync job: {e}")
+
+def sync_job_status(job):
+    """JSON-serializable status of a job (for /admin/sync)."""
+    return {
+        'id': job.id,
+        'mode': job.mode,
+        'status': job.status,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'progress': {'pages': job.pages, 'created': job.created, 'updated': job.updated,
+                     'deleted': job.deleted, 'errors': job.errors},
+        'message': job.message,
+    }
+
+
+# --- Worker heartbeat ---
+
+SYNC_WORKER_HEARTBEAT_KEY = 'sync_worker_heartbeat'
+
+def touch_sync_worker_heartbeat():
+    """Called by the sync worker while it is alive. Commits."""
+    set_sync_state(SYNC_WORKER_HEARTBEAT_KEY, datetime.utcnow().isoformat())
+    db.session.commit()
+
+def sync_worker_heartbeat_age():
+    """Seconds since the last heartbeat of a sync worker, None if there never was one."""
+    value = get_sync_state(SYNC_WORKER_HEARTBEAT_KEY)
+    if not value:
+        return None
+    return (datetime.utcnow() - datetime.fromisoformat(value)).total_seconds()
@@ -0,0 +1,133 @@
+# projekt/sync_worker.py
+
+"""
+Sync worker: runs the product sync outside the web processes.
+
+    python -m projekt.sync_worker          # runs until SIGTERM/SIGINT
+    python -m projekt.sync_worker --once   # executes the queued jobs, then exits
+
+- Only ONE worker runs at a time (lock on <instance>/sync_worker.lock) and
+  it executes one SyncJob at a time, so two syncs never overlap.
+- Picks up the jobs queued by /admin/sync and queues its own delta sync
+  every ERP_SYNC_MINUTES and deletion scan every ERP_KEY_SCAN_MINUTES
+  (not with --once).
+- SIGTERM/SIGINT: the running job is finished, then the worker exits.
+"""
+
+import argparse
+import os
+import signal
+import sys
+import time
+
+from . import create_app, db
+from .scheduler_lock import fcntl, try_lock_file
+from .sync import (ERP_SYNC_MINUTES, ERP_KEY_SCAN_MINUTES, enqueue_sync_job, has_pending_sync_job,
+                   claim_next_sync_job, fail_interrupted_sync_jobs, run_sync_job, touch_sync_worker_heartbeat)
+
+
+SYNC_WORKER_LOCK_FILE = 'sync_worker.lock'
+
+# mode -> interval in seconds of the jobs the worker queues itself
+SCHEDULED_JOBS = {
+    'delta': ERP_SYNC_MINUTES * 60,
+    'scan': ERP_KEY_SCAN_MINUTES * 60,
+}
+
+
+class SyncWorker:
+
+    def __init__(self, app, poll_seconds=2, heartbeat_seconds=30):
+        self.app = app
+        self.poll_seconds = poll_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.stopping = False
+        self._heartbeat_at = None
+        now = time.monotonic()
+        # The delta sync runs right after the start (catch up), the scan after its first interval
+        self._next_run = {'delta': now, 'scan': now + SCHEDULED_JOBS['scan']}
+
+    def stop(self, signum=None, frame=None):
+        print(f"Sync worker: stopping after the current job (signal {signum})")
+        self.stopping = True
+
+    def heartbeat(self, force=False):
+        now = time.monotonic()
+        if force or self._heartbeat_at is None or now - self._heartbeat_at >= self.heartbeat_seconds:
+            touch_sync_worker_heartbeat()
+            self._heartbeat_at = now
+
+    def queue_scheduled_jobs(self):
+        now = time.monotonic()
+        queued = False
+        for mode, interval in SCHEDULED_JOBS.items():
+            if now < self._next_run[mode]:
+                continue
+            self._next_run[mode] = now + interval
+            if not has_pending_sync_job(mode):
+                enqueue_sync_job(mode)
+                queued = True
+        if queued:
+            db.session.commit()
+
+    def run_next_job(self):
+        """Executes the oldest queued job. Returns False if there was none."""
+        job = claim_next_sync_job()
+        if job is None:
+            return False
+        print(f"Sync worker: job #{job.id} ({job.mode}) started")
+        message = run_sync_job(job) # Marks the job done/failed, also on unexpected errors
+        print(f"Sync worker: job #{job.id} {job.status}: {message}")
+        self.heartbeat(force=True)
+        return True
+
+    def run(self, once=False):
+        with self.app.app_context():
+            db.create_all()
+            interrupted = fail_interrupted_sync_jobs()
+            if interrupted:
+                print(f"Sync worker: {interrupted} interrupted job(s) marked as failed")
+
+        while not self.stopping:
+            # One app context (and DB session) per round, so no session outlives a job
+            with self.app.app_context():
+                self.heartbeat()
+                if not once:
+                    self.queue_scheduled_jobs()
+                ran = self.run_next_job()
+            if ran:
+                continue
+            if once:
+                break
+            self._sleep(self.poll_seconds)
+
+    def _sleep(self, seconds):
+        deadline = time.monotonic() + seconds
+        while not self.stopping and time.monotonic() < deadline:
+            time.sleep(min(0.2, seconds))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--once', action='store_true', help='Execute the queued jobs, then exit')
+    args = parser.parse_args(argv)
+    app = create_app()
+
+    # Without fcntl (Windows) there is no lock: start only one worker there
+    if fcntl is not None:
+        os.makedirs(app.instance_path, exist_ok=True)
+        if not try_lock_file(os.path.join(app.instance_path, SYNC_WORKER_LOCK_FILE)):
+            print("Sync worker: another sync worker is already running, exiting.")
+            return 1
+
+    worker = SyncWorker(app, poll_seconds=app.config['SYNC_WORKER_POLL_SECONDS'],
+                        heartbeat_seconds=app.config['SYNC_WORKER_HEARTBEAT_SECONDS'])
+    signal.signal(signal.SIGTERM, worker.stop)
+    signal.signal(signal.SIGINT, worker.stop)
+    print(f"Sync worker started (pid {os.getpid()})")
+    worker.run(once=args.once)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+# projekt/template_cache.py
+
+"""
+Template caches.
+
+- Bytecode cache: compiled templates are stored in <instance>/jinja_cache,
+  so new or restarted workers load them instead of compiling every
+  template from source again (the file is keyed on the source checksum,
+  edited templates are recompiled).
+- Fragment cache: {% cache key, ... %}...{% endcache %} stores the
+  rendered block in a process-local LRU under (template, line, keys).
+  Everything the block shows must be part of the key, e.g.
+
+      {% cache p.id, catalog_version %} ... {% endcache %}   (_product_table.html)
+
+  With the catalog version in the key, rows rendered before a sync are
+  never served again and simply fall out of the LRU.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+
+class FragmentCache:
+    """LRU of rendered template fragments (Markup)."""
+
+    def __init__(self, max_size=5000):
+        self.max_size = max_size
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            html = self._fragments.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._fragments.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key, html):
+        with self._lock:
+            self._fragments[key] = html
+            self._fragments.move_to_end(key)
+            while len(self._fragments) > self.max_size:
+                self._fragments.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._fragments)}
+
+
+class FragmentCacheExtension(Extension):
+    """The {% cache %} tag, backed by environment.fragment_cache (None = render every time)."""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        keys = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            keys.append(parser.parse_expression())
+        body = parser.parse_statements(('name:endcache',), drop_needle=True)
+        prefix = nodes.Const(f"{parser.name}:{lineno}")
+        return nodes.CallBlock(self.call_method('_render', [prefix, nodes.List(keys)]),
+                               [], [], body).set_lineno(lineno)
+
+    def _render(self, prefix, keys, caller):
+        cache = self.environment.fragment_cache
+        if cache is None:
+            return caller()
+        key = (prefix, *keys)
+        html = cache.get(key)
+        if html is None:
+            html = caller()
+            cache.put(key, html)
+        return html
+
+
+def init_template_caches(app):
+    """
+    Installs the bytecode cache and the {% cache %} tag via app.jinja_options,
+    so must run before app.jinja_env is first used.
+    """
+    options = dict(app.jinja_options)
+    options['extensions'] = [*options.get('extensions', ()), FragmentCacheExtension]
+    if app.config['JINJA_BYTECODE_CACHE']:
+        cache_dir = os.path.join(app.instance_path, 'jinja_cache')
+        os.makedirs(cache_dir, exist_ok=True)
+        options['bytecode_cache'] = FileSystemBytecodeCache(cache_dir)
+    app.jinja_options = options
+    if app.config['FRAGMENT_CACHE_SIZE'] > 0:
+        app.jinja_env.fragment_cache = FragmentCache(max_size=app.config['FRAGMENT_CACHE_SIZE'])
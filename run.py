@@ -1,22 +1,25 @@
 # run.py
 
-# Importiert die Instanzen, die in projekt/__init__.py erstellt wurden
-from projekt import app, db, scheduler 
+# Entwicklungsserver (Werkzeug, debug=True). Für den Produktionsbetrieb
+# siehe wsgi.py und gunicorn.conf.py.
+
+import os
+
+# App-Factory und Erweiterungen aus projekt/__init__.py
+from projekt import create_app, db, start_scheduler
+
+app = create_app()
 
 if __name__ == '__main__':
     # Erstellt die Datenbanktabellen, falls sie noch nicht existieren
     with app.app_context():
         db.create_all()
     
-    # Scheduler initialisieren und starten
-    scheduler.init_app(app)
-    scheduler.start()
-    
-    # Wichtiger Hinweis für den Debug-Modus
-    if app.debug:
-        print("--- WARNUNG: DEBUG-MODUS ---")
-        print("Der automatische Scheduler wird wegen des Flask-Reloaders")
-        print("ggf. zweimal ausgeführt. Das ist im Debug-Modus normal.")
-        print("Nutzen Sie für stabile Tests den manuellen 'Sync ERP'-Button.")
+    # Scheduler initialisieren und starten - im Debug-Modus nur im Kindprozess
+    # des Reloaders (der Elternprozess überwacht nur die Dateien), damit die
+    # Jobs nicht zweimal laufen
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_scheduler(app)
+        print("Produkt-Sync: in einem zweiten Terminal 'python -m projekt.sync_worker' starten")
 
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=True)
@@ -0,0 +1,64 @@
+# tests/conftest.py
+
+import contextlib
+import itertools
+
+import pytest
+from sqlalchemy import event
+
+from projekt import create_app, db, erp, sync
+from projekt.erp_stub import ErpStubAdapter
+
+
+@pytest.fixture
+def app(tmp_path):
+    """App on a fresh SQLite database, ERP stub mounted, catalog synced."""
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'shop.db'}",
+        'JINJA_BYTECODE_CACHE': False,
+        'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000', # Fast, the tests do not test hashing
+        'PASSWORD_HASH_WORKERS': 0,
+    })
+    stub = ErpStubAdapter(catalog_size=100)
+    with app.app_context():
+        stub.mount(erp.erp_client.session, erp.ERP_BASE_URL)
+        db.create_all()
+        sync.perform_erp_sync(mode='full')
+    app.erp_stub = stub
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+_user_numbers = itertools.count(1)
+
+def register(client, email=None, name='Test User', password='test-password'):
+    """Registers a user (and is logged in afterwards). Returns the user's ID."""
+    client.post('/register', data={
+        'name': name, 'email': email or f"user{next(_user_numbers)}@example.com", 'password': password,
+        'street': 'Teststr.', 'house_number': '1', 'zip_code': '12345', 'city': 'Testtown',
+    })
+    with client.session_transaction() as sess:
+        return int(sess['_user_id'])
+
+
+@contextlib.contextmanager
+def count_sql(app):
+    """Collects the SQL statements executed in the block (list of strings)."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
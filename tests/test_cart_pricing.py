@@ -0,0 +1,69 @@
+# tests/test_cart_pricing.py
+
+import pytest
+
+from projekt import routes
+
+from conftest import count_sql, register
+
+
+CART_SIZES = (1, 10, 50)
+
+
+def fill_cart(app, client, user_id, cart_size):
+    """Puts cart_size products into the user's cart (without the ERP)."""
+    product_ids = list(app.erp_stub.products)[:cart_size]
+    with app.app_context():
+        cart_id = routes.cart_store.cart_id_for_user(user_id, create=True)
+        routes.cart_store.clear(cart_id)
+        for pid in product_ids:
+            routes.cart_store.set_quantity(cart_id, pid, 1)
+    with client.session_transaction() as sess:
+        sess['cart_id'] = cart_id
+
+
+@pytest.fixture
+def shopper(app, client):
+    """Logged-in user with ERP customer (created by a first checkout)."""
+    user_id = register(client)
+    fill_cart(app, client, user_id, 1)
+    response = client.post('/checkout')
+    assert response.headers['Location'].endswith('/orders')
+    client.get('/cart') # Reloads the cached identity (the checkout stored the ERP customer ID)
+    return user_id
+
+
+def test_cart_page_sql_count_independent_of_cart_size(app, client, shopper):
+    counts = {}
+    for cart_size in CART_SIZES:
+        fill_cart(app, client, shopper, cart_size)
+        client.get('/cart') # Warm-up (caches of the layout)
+        with count_sql(app) as statements:
+            response = client.get('/cart')
+        assert response.status_code == 200
+        counts[cart_size] = len(statements)
+    assert len(set(counts.values())) == 1, counts
+
+
+def test_checkout_sql_count_independent_of_cart_size(app, client, shopper):
+    counts = {}
+    for cart_size in CART_SIZES:
+        fill_cart(app, client, shopper, cart_size)
+        with count_sql(app) as statements:
+            response = client.post('/checkout')
+        assert response.headers['Location'].endswith('/orders')
+        counts[cart_size] = len(statements)
+    assert len(set(counts.values())) == 1, counts
+
+
+def test_priced_cart_totals(app, client, shopper):
+    fill_cart(app, client, shopper, 10)
+    with app.test_request_context():
+        with client.session_transaction() as sess:
+            cart_id = sess['cart_id']
+        lines, removed = routes.cart_store.lines(cart_id)
+        cart = routes.PricedCart(lines)
+    assert removed == 0
+    assert len(cart.items) == 10
+    assert cart.total == sum(p.price for p, qty in lines)
+    assert cart.erp_items()[0]['quantity'] == 1
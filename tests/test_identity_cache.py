@@ -0,0 +1,53 @@
+# tests/test_identity_cache.py
+
+import re
+
+from conftest import count_sql, register
+
+
+USER_SELECT = re.compile(r'^SELECT\b.*\sFROM\s+"?user"?\s', re.S)
+
+
+def user_selects(statements):
+    return [s for s in statements if USER_SELECT.match(s)]
+
+
+def login(client, email, password='test-password'):
+    client.get('/logout')
+    response = client.post('/login', data={'email': email, 'password': password})
+    assert response.headers['Location'].endswith('/')
+
+
+def test_user_loader_selects_user_only_on_first_request(app, client):
+    register(client, email='loader@example.com')
+    login(client, 'loader@example.com')
+
+    with count_sql(app) as first:
+        assert client.get('/').status_code == 200
+    with count_sql(app) as later:
+        for path in ('/', '/cart', '/profile', '/?page=2', '/cart'):
+            assert client.get(path).status_code == 200
+
+    assert len(user_selects(first)) <= 1 # Snapshot from before the login may still be valid
+    assert user_selects(later) == []
+
+
+def test_profile_update_invalidates_snapshot(app, client):
+    register(client, email='profile@example.com', name='Old Name')
+    login(client, 'profile@example.com')
+    assert b'value="Old Name"' in client.get('/profile').data
+
+    response = client.post('/profile', data={
+        'name': 'New Name', 'email': 'profile@example.com', 'current_password': 'test-password',
+        'street': 'Teststr.', 'house_number': '1', 'zip_code': '12345', 'city': 'Testtown',
+    })
+    assert response.status_code == 302
+
+    with count_sql(app) as statements:
+        data = client.get('/profile').data
+    assert b'value="New Name"' in data
+    assert len(user_selects(statements)) == 1 # Reloaded once ...
+
+    with count_sql(app) as statements:
+        assert b'value="New Name"' in client.get('/profile').data
+    assert user_selects(statements) == [] # ... and cached again
@@ -0,0 +1,19 @@
+# tests/test_metrics.py
+
+import projekt
+
+
+def test_metrics_are_per_app(app, client, tmp_path):
+    other = projekt.create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'other.db'}",
+                                'JINJA_BYTECODE_CACHE': False})
+    with other.app_context():
+        projekt.db.create_all()
+
+    response = client.get('/login')
+    assert 'db;dur=' in response.headers['Server-Timing']
+    assert 'shop_http_request_duration_seconds_count{route="shop.login"' in client.get('/metrics').text
+
+    other_metrics = other.test_client().get('/metrics').text
+    assert 'route="shop.login"' not in other_metrics
+    # Collectors are registered once per app
+    assert other_metrics.count('# TYPE shop_erp_outbox_depth gauge') == 1
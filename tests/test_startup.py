@@ -0,0 +1,24 @@
+# tests/test_startup.py
+
+from benchmarks.bench_startup import run_child
+
+
+# Generous: cold start plus first request takes ~0.7 s on one core
+STARTUP_BUDGET_MS = 5000
+# Every further app instance must not pay the import cost again
+CREATE_APP_BUDGET_MS = 500
+
+
+def test_startup_within_budget(tmp_path):
+    result = run_child(tmp_path / 'shop.db', again=3)
+
+    assert result['status'] == 200
+    assert result['total'] * 1000 < STARTUP_BUDGET_MS, result
+    assert max(result['again']) * 1000 < CREATE_APP_BUDGET_MS, result
+
+
+def test_startup_does_not_import_apscheduler(tmp_path):
+    # Only the process that runs the scheduler imports it (start_scheduler())
+    result = run_child(tmp_path / 'shop.db', again=0)
+
+    assert result['apscheduler'] is False
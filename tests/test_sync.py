@@ -0,0 +1,37 @@
+# tests/test_sync.py
+
+from projekt import db, sync
+from projekt.models import Product
+
+
+def test_delta_sync_reads_products_at_the_high_water_mark(app):
+    stub = app.erp_stub
+    with app.app_context():
+        mark = sync.get_sync_state(sync.SYNC_MARK_KEY)
+        latest = max(stub.products.values(), key=lambda p: sync.parse_erp_timestamp(p['modifiedAt']))
+        assert sync.parse_erp_timestamp(mark) == sync.parse_erp_timestamp(latest['modifiedAt'])
+
+        # Changed in the same millisecond as the newest product already synced
+        guid = next(g for g in stub.products if g != latest['ID'])
+        stub.products[guid].update(name='Renamed', modifiedAt=latest['modifiedAt'])
+
+        assert 'Updated: 1,' in sync.perform_erp_sync(mode='delta')
+        assert db.session.get(Product, guid).name == 'Renamed'
+        assert sync.parse_erp_timestamp(sync.get_sync_state(sync.SYNC_MARK_KEY)) == sync.parse_erp_timestamp(mark)
+
+
+def test_unexpected_sync_error_finishes_the_job(app, monkeypatch):
+    def broken_sync(mode, job=None):
+        job.pages = 1 # Unflushed change, discarded by the rollback
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(sync, 'perform_erp_sync', broken_sync)
+    with app.app_context():
+        sync.enqueue_sync_job('delta')
+        db.session.commit()
+        job = sync.claim_next_sync_job()
+
+        assert sync.run_sync_job(job) == 'Error during sync job: boom'
+        db.session.expire_all()
+        assert (job.status, job.pages) == ('failed', 0)
+        assert job.finished_at is not None
@@ -0,0 +1,16 @@
+# wsgi.py
+
+# Einstiegspunkt für einen WSGI-Server im Produktionsbetrieb, z.B.:
+#     gunicorn -c gunicorn.conf.py wsgi:app
+# Der Scheduler wird NICHT hier gestartet, sondern in genau einem Worker
+# (siehe post_fork in gunicorn.conf.py und projekt/scheduler_lock.py).
+
+from projekt import create_app, db
+
+app = create_app()
+
+with app.app_context():
+    # Erstellt die Datenbanktabellen, falls sie noch nicht existieren
+    db.create_all()
+    # Verbindungen schließen, bevor gunicorn die Worker forkt
+    db.engine.dispose()